@@ -1,24 +1,84 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from typing import List, Optional
 import tempfile
-import shutil
 import os
 import base64
 import io
+import json
+import logging
+import secrets
+import socket
+import httpx
 from PIL import Image
 import numpy as np
 from fastapi.staticfiles import StaticFiles
 
-app = FastAPI(title="YOLO11n Inference API")
+import autotune
+from batching import InferenceBatcher
+from imaging import decode_image
+from jobs import JobStore, JobWorkerPool, job_owner, valid_owner
+from profiler import ProfilerBusy, SamplingProfiler, to_collapsed, to_speedscope
+from quantization import prepare_variant
+from scheduling import BULK, PRIORITY_CLASSES, WeightedFairQueue, parse_api_keys
+from timing import REQUEST_ID_HEADER, StageTimer, resolve_request_id
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # thread counts must be applied before the model runs anything
+    settings = await run_in_threadpool(autotune.resolve_settings, model_handler.model_path, model_handler.precision)
+    autotune.apply_torch_threads(settings)
+    batcher.configure(workers=settings["workers"], max_batch_size=settings["max_batch_size"])
+    if model_handler.precision != "fp32":
+        # exporting a reduced-precision variant can take minutes; do it before serving traffic
+        await run_in_threadpool(model_handler.load)
+    job_workers.start()
+    grpc_server = None
+    if GRPC_PORT:
+        # imported here so the HTTP API runs without grpcio installed
+        import grpc_service
+        servicer = grpc_service.InferenceServicer(
+            batcher, _preds_to_json, _request_priority, profiler,
+            max_in_flight=int(os.environ.get("GRPC_STREAM_MAX_IN_FLIGHT", "16")))
+        grpc_server, _ = grpc_service.start_server(
+            servicer, int(GRPC_PORT), max_workers=int(os.environ.get("GRPC_MAX_WORKERS", "32")))
+    yield
+    if grpc_server is not None:
+        grpc_server.stop(grace=5).wait()
+    job_workers.stop()
+    if JOB_HANDOFF_OWNER and JOB_HANDOFF_OWNER != JOB_OWNER:
+        await run_in_threadpool(_hand_off_jobs)
+    job_store.close()
+
+
+app = FastAPI(title="YOLO11n Inference API", lifespan=lifespan)
+
+logger = logging.getLogger("api")
+
+# One JSON line per request with the per-stage breakdown
+access_logger = logging.getLogger("api.access")
+if not access_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    access_logger.addHandler(_handler)
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
 
 
 class ModelHandler:
-    """Lazy loader for the underlying YOLO model."""
+    """Lazy loader for the underlying YOLO model.
+
+    `precision` (or `YOLO_PRECISION`) selects `fp32` (default) or `int8`; the
+    INT8 variant is exported once and cached, see `quantization.py`.
+    """
 
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, precision: Optional[str] = None):
         self.model = None
         self.model_path = model_path or os.environ.get("YOLO_MODEL", "yolo11n.pt")
+        self.precision = (precision or os.environ.get("YOLO_PRECISION", "fp32")).lower()
 
     def load(self):
         if self.model is None:
@@ -28,20 +88,102 @@ class ModelHandler:
                 raise RuntimeError("ultralytics package is required for inference: pip install ultralytics") from e
 
             # load model (this may download or load from a local path)
-            self.model = YOLO(self.model_path)
+            if self.precision == "fp32":
+                self.model = YOLO(self.model_path)
+            else:
+                self.model = YOLO(prepare_variant(self.model_path, self.precision), task="detect")
         return self.model
 
 
 model_handler = ModelHandler()
+profiler = SamplingProfiler()
+scheduler = WeightedFairQueue(min_shares={BULK: float(os.environ.get("BULK_MIN_SHARE", "0.1"))})
+batcher = InferenceBatcher(
+    model_handler,
+    max_wait_ms=float(os.environ.get("BATCH_MAX_WAIT_MS", "5")),
+    profiler=profiler,
+    scheduler=scheduler,
+)
+PRIORITY_API_KEYS = parse_api_keys(os.environ.get("PRIORITY_API_KEYS", ""))
+DEFAULT_PRIORITY = os.environ.get("DEFAULT_PRIORITY", BULK).lower()
+if DEFAULT_PRIORITY not in PRIORITY_CLASSES:
+    # otherwise every request without a valid header or key would fail with a 500
+    raise RuntimeError(f"DEFAULT_PRIORITY must be one of {', '.join(PRIORITY_CLASSES)}, got {DEFAULT_PRIORITY!r}")
+# With several replicas each keeps its own job store: JOB_PEER_URL (e.g.
+# "http://{owner}.backend-headless:8000") lets any replica forward a lookup to
+# the one named in the job ID. JOB_OWNER defaults to the hostname, which is the
+# pod name in a StatefulSet.
+JOB_PEER_URL = os.environ.get("JOB_PEER_URL")
+JOB_OWNER = os.environ.get("JOB_OWNER") or socket.gethostname().split(".")[0].lower()
+if JOB_PEER_URL and not valid_owner(JOB_OWNER):
+    raise RuntimeError(f"JOB_OWNER must be a lowercase DNS label to route jobs between replicas, got {JOB_OWNER!r}")
+JOB_FORWARDED_HEADER = "X-Job-Forwarded-By"
+# A replica removed by a scale-in never comes back for its jobs, so on shutdown
+# each one hands them (pending images included) to JOB_HANDOFF_OWNER, which
+# lookups fall back to. Peers authenticate with the shared JOB_PEER_TOKEN.
+JOB_HANDOFF_OWNER = os.environ.get("JOB_HANDOFF_OWNER")
+JOB_PEER_TOKEN = os.environ.get("JOB_PEER_TOKEN")
+JOB_PEER_TOKEN_HEADER = "X-Job-Peer-Token"
+if JOB_HANDOFF_OWNER and not (JOB_PEER_URL and JOB_PEER_TOKEN and valid_owner(JOB_HANDOFF_OWNER)):
+    raise RuntimeError("JOB_HANDOFF_OWNER must be a lowercase DNS label and needs JOB_PEER_URL and JOB_PEER_TOKEN")
+job_store = JobStore(os.environ.get("JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "yolo-jobs.db")),
+                     owner=JOB_OWNER if JOB_PEER_URL else None)
+# Port for the binary gRPC interface (see grpc_service.py); unset disables it
+GRPC_PORT = os.environ.get("GRPC_PORT")
 
 
-def _save_upload_to_temp(upload: UploadFile) -> str:
-    suffix = os.path.splitext(upload.filename)[1] or ".jpg"
-    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
-    os.close(fd)
-    with open(tmp_path, "wb") as out:
-        shutil.copyfileobj(upload.file, out)
-    return tmp_path
+def _annotate(result) -> Optional[str]:
+    """Return the annotated image for `result` as a base64 JPEG, or None."""
+    # try to get annotated image from results.plot() (returns ndarray)
+    try:
+        annotated_arr = result.plot()
+        if annotated_arr is not None:
+            # plot may return BGR image (opencv style); convert to RGB
+            if isinstance(annotated_arr, np.ndarray) and annotated_arr.ndim == 3 and annotated_arr.shape[2] == 3:
+                # convert BGR -> RGB
+                annotated_arr = annotated_arr[:, :, ::-1]
+            img = Image.fromarray(annotated_arr.astype('uint8'))
+            buf = io.BytesIO()
+            img.save(buf, format='JPEG')
+            return base64.b64encode(buf.getvalue()).decode('ascii')
+        # fallback: attempt to save to file then read
+        fd, annotated_path = tempfile.mkstemp(suffix=".annotated.jpg")
+        os.close(fd)
+        try:
+            result.plot(save=annotated_path)
+            if os.path.getsize(annotated_path):
+                with open(annotated_path, 'rb') as f:
+                    return base64.b64encode(f.read()).decode('ascii')
+        finally:
+            _remove_temp_files(annotated_path)
+    except Exception:
+        # don't fail the whole request if image annotation fails
+        logger.warning("image annotation failed", exc_info=True)
+    return None
+
+
+def _request_priority(headers) -> str:
+    """Priority class for a request: API key mapping, then `X-Priority`, then DEFAULT_PRIORITY.
+
+    `headers` is the HTTP headers or gRPC metadata (lowercase keys).
+    """
+    api_key = headers.get("x-api-key")
+    if api_key and api_key in PRIORITY_API_KEYS:
+        return PRIORITY_API_KEYS[api_key]
+    requested = headers.get("x-priority", "").lower()
+    if requested in PRIORITY_CLASSES:
+        return requested
+    return DEFAULT_PRIORITY
+
+
+def _remove_temp_files(*paths: str):
+    # a failed removal leaks disk in long-running pods, so make it visible
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            logger.warning("failed to remove temp file %s", path, exc_info=True)
 
 
 def _preds_to_json(results) -> dict:
@@ -51,76 +193,236 @@ def _preds_to_json(results) -> dict:
         boxes = r.boxes
         if boxes is None:
             continue
+        names = getattr(r, "names", None) or {}
         for b in boxes:
             xyxy = b.xyxy.tolist()[0]
             score = float(b.conf.tolist()[0]) if hasattr(b, "conf") else float(b.conf[0])
             cls = int(b.cls.tolist()[0]) if hasattr(b, "cls") else int(b.cls[0])
-            out["predictions"].append({
+            prediction = {
                 "xyxy": [float(x) for x in xyxy],
                 "score": score,
                 "class": cls,
-            })
+            }
+            if cls in names:
+                prediction["name"] = names[cls]
+            out["predictions"].append(prediction)
     return out
 
 
+job_workers = JobWorkerPool(
+    job_store,
+    batcher,
+    _preds_to_json,
+    workers=int(os.environ.get("JOB_WORKERS", "1")),
+    batch_size=int(os.environ.get("JOB_BATCH_SIZE", "8")),
+    ttl_seconds=float(os.environ.get("JOB_TTL_SECONDS", "3600")),
+    gc_interval=float(os.environ.get("JOB_GC_INTERVAL", "60")),
+)
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Attach a request ID and stage timer, then emit Server-Timing and an access log line."""
+    request_id = resolve_request_id(request.headers.get(REQUEST_ID_HEADER))
+    timer = StageTimer(request_id)
+    request.state.timer = timer
+    response = await call_next(request)
+    total = timer.elapsed()
+    profiler.complete(request_id, total)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    response.headers["Server-Timing"] = timer.server_timing(total)
+    access_logger.info(json.dumps({
+        "request_id": request_id,
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        "duration_ms": round(total * 1000, 3),
+        "stages_ms": timer.stages_ms(),
+    }))
+    return response
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
 
+# CPU-bound sections of /predict run in the threadpool so they neither block the
+# event loop nor serialize on one core; each attaches its own thread to the
+# profiler, since samples of the event loop thread belong to other requests
+def _decode_upload(file: UploadFile, timer: StageTimer) -> np.ndarray:
+    with profiler.attach(timer.request_id), timer.stage("decode"):
+        return decode_image(file.file.read())
+
+
+def _render_predictions(result, return_image: bool, timer: StageTimer) -> dict:
+    with profiler.attach(timer.request_id):
+        with timer.stage("postprocess"):
+            payload = _preds_to_json([result])
+
+        if return_image:
+            with timer.stage("encode"):
+                data = _annotate(result)
+            if data is not None:
+                payload['image'] = data
+    return payload
+
+
 @app.post("/predict")
-async def predict(file: UploadFile = File(...), return_image: bool = Query(False)):
+async def predict(request: Request, file: UploadFile = File(...), return_image: bool = Query(False)):
     """Run YOLO inference on an uploaded image.
 
     - `file`: image file upload
     - `return_image`: if true, returns annotated image as base64 in `image` field
     """
-    tmp_path = None
+    timer = request.state.timer
+    # everything before the handler body runs is receiving and parsing the upload
+    timer.lap("upload")
     try:
-        tmp_path = _save_upload_to_temp(file)
-        model = model_handler.load()
-        # run inference
-        results = model(tmp_path)
-
-        payload = _preds_to_json(results)
+        # decoded here so the model gets arrays it can batch, as jobs and gRPC do
+        image = await run_in_threadpool(_decode_upload, file, timer)
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"invalid image: {e}")
 
-        if return_image:
-            # try to get annotated image from results.plot() (returns ndarray)
-            try:
-                annotated_path = tmp_path + ".annotated.jpg"
-                annotated_arr = results[0].plot()
-                if annotated_arr is not None:
-                    # plot may return BGR image (opencv style); convert to RGB
-                    if isinstance(annotated_arr, np.ndarray) and annotated_arr.ndim == 3 and annotated_arr.shape[2] == 3:
-                        # convert BGR -> RGB
-                        annotated_arr = annotated_arr[:, :, ::-1]
-                    img = Image.fromarray(annotated_arr.astype('uint8'))
-                    buf = io.BytesIO()
-                    img.save(buf, format='JPEG')
-                    data = base64.b64encode(buf.getvalue()).decode('ascii')
-                    payload['image'] = data
-                else:
-                    # fallback: attempt to save to file then read
-                    results[0].plot(save=annotated_path)
-                    if os.path.exists(annotated_path):
-                        with open(annotated_path, 'rb') as f:
-                            data = base64.b64encode(f.read()).decode('ascii')
-                        payload['image'] = data
-            except Exception:
-                # don't fail the whole request if image annotation fails
-                pass
-
-        return JSONResponse(payload)
+    try:
+        outcome = await batcher.infer(image, request_id=timer.request_id, priority=_request_priority(request.headers))
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        try:
-            if tmp_path and os.path.exists(tmp_path):
-                os.remove(tmp_path)
-            if tmp_path and os.path.exists(tmp_path + ".annotated.jpg"):
-                os.remove(tmp_path + ".annotated.jpg")
-        except Exception:
-            pass
+    timer.record("queue", outcome.queue_seconds)
+    timer.record("inference", outcome.inference_seconds)
+
+    payload = await run_in_threadpool(_render_predictions, outcome.result, return_image, timer)
+    return JSONResponse(payload)
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Per priority class queue depth, dispatch share and wait/latency percentiles."""
+    return scheduler.stats()
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(files: List[UploadFile] = File(...)):
+    """Queue images for asynchronous inference; poll `GET /jobs/{id}` for results."""
+    # read one upload at a time as the store inserts it; large ones are spooled to disk
+    uploads = ((f.filename, f.file.read()) for f in files)
+    job_id = await run_in_threadpool(job_store.create, uploads)
+    return {"id": job_id, "status": "queued", "total": len(files)}
+
+
+def _peer_url(owner: str, path: str) -> str:
+    return f"{JOB_PEER_URL.format(owner=owner).rstrip('/')}{path}"
+
+
+async def _forward_job_lookup(owner: str, job_id: str, results: bool) -> JSONResponse:
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        r = await client.get(_peer_url(owner, f"/jobs/{job_id}"), params={"results": str(results).lower()},
+                             headers={JOB_FORWARDED_HEADER: JOB_OWNER})
+    return JSONResponse(r.json(), status_code=r.status_code)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request, results: bool = Query(True)):
+    """Job status and counts, plus per-image predictions for finished images when `results` is true."""
+    owner = job_owner(job_id)
+    if JOB_PEER_URL and owner and JOB_FORWARDED_HEADER not in request.headers:
+        # the replica that created the job, then the one it hands jobs to on shutdown
+        unavailable = None
+        for holder in dict.fromkeys(h for h in (owner, JOB_HANDOFF_OWNER) if h):
+            if holder == JOB_OWNER:
+                job = await run_in_threadpool(job_store.get, job_id, results)
+                if job is not None:
+                    return job
+                continue
+            try:
+                response = await _forward_job_lookup(holder, job_id, results)
+            except (httpx.HTTPError, ValueError) as e:
+                unavailable = unavailable or HTTPException(
+                    status_code=503, detail=f"replica {holder} holding this job is unavailable: {e}")
+                continue
+            if response.status_code != 404:
+                return response
+        if unavailable is not None:
+            raise unavailable
+        raise HTTPException(status_code=404, detail="job not found (unknown or expired)")
+    job = await run_in_threadpool(job_store.get, job_id, results)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found (unknown or expired)")
+    return job
+
+
+@app.put("/jobs/{job_id}", include_in_schema=False)
+async def adopt_job(job_id: str, request: Request, x_job_peer_token: Optional[str] = Header(None)):
+    """Take over a job from a replica that is shutting down; peers only."""
+    if not JOB_PEER_TOKEN or not x_job_peer_token or not secrets.compare_digest(x_job_peer_token, JOB_PEER_TOKEN):
+        raise HTTPException(status_code=403, detail="invalid job peer token")
+    job = await request.json()
+    if not isinstance(job, dict) or job.get("id") != job_id:
+        raise HTTPException(status_code=400, detail="body must be the exported job with this ID")
+    try:
+        await run_in_threadpool(job_store.adopt, job)
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"malformed job: {e}")
+    return {"id": job_id, "status": job["status"]}
+
+
+def _hand_off_jobs():
+    """Move every job in the local store to JOB_HANDOFF_OWNER, deleting each once it is stored there."""
+    moved = 0
+    try:
+        with httpx.Client(timeout=60.0) as client:
+            for job in job_store.export():
+                client.put(_peer_url(JOB_HANDOFF_OWNER, f"/jobs/{job['id']}"), json=job,
+                           headers={JOB_PEER_TOKEN_HEADER: JOB_PEER_TOKEN}).raise_for_status()
+                job_store.delete(job["id"])
+                moved += 1
+    except httpx.HTTPError:
+        # what is left is served again if this replica comes back
+        logger.exception("handed %d jobs to %s before failing; keeping the rest", moved, JOB_HANDOFF_OWNER)
+    else:
+        if moved:
+            logger.info("handed %d jobs to %s", moved, JOB_HANDOFF_OWNER)
+
+
+def _require_admin(token: Optional[str]):
+    expected = os.environ.get("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="admin endpoints are disabled; set ADMIN_TOKEN to enable")
+    if not token or not secrets.compare_digest(token, expected):
+        raise HTTPException(status_code=403, detail="invalid admin token")
+
+
+@app.get("/admin/profile")
+async def admin_profile(
+    seconds: float = Query(10.0, gt=0, le=300),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    min_duration_ms: Optional[float] = Query(None, ge=0),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """Sample all threads of this process for `seconds` and return the stacks.
+
+    - `format`: `collapsed` (flamegraph.pl / speedscope text) or `speedscope` JSON
+    - `min_duration_ms`: only keep samples from requests slower than this
+    - requires the `X-Admin-Token` header to match the `ADMIN_TOKEN` env var
+    """
+    _require_admin(x_admin_token)
+    interval = interval_ms / 1000
+    min_duration = min_duration_ms / 1000 if min_duration_ms is not None else None
+    try:
+        counts = await run_in_threadpool(profiler.profile, seconds, interval, min_duration)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "speedscope":
+        return JSONResponse(
+            to_speedscope(counts, interval=interval),
+            headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'},
+        )
+    return PlainTextResponse(
+        to_collapsed(counts),
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed.txt"'},
+    )
 
 
 # Note: static demo was moved to top-level `frontend/` using Gradio
@@ -0,0 +1,291 @@
+"""Startup autotuner for torch thread counts, inference workers and batch size.
+
+Benchmarks the loaded model with synthetic images over a small grid and picks
+the configuration with the highest throughput whose p95 batch latency stays
+within a budget. Results are persisted per hardware class (CPU model, CPU
+quota, model and precision) so later pods on the same kind of node skip the
+search.
+
+torch only lets inter-op threads be set once per process, so each inter-op
+value is measured in a fresh spawned subprocess. Variants that don't run on
+torch (the INT8 OpenVINO export) skip the thread dimensions and leave the
+thread settings unset.
+
+Settings are resolved in this order: explicit env vars (TORCH_INTRA_THREADS,
+TORCH_INTEROP_THREADS, INFERENCE_WORKERS, MAX_BATCH_SIZE), then a cached
+entry for this hardware class in AUTOTUNE_CACHE, then a fresh search if
+AUTOTUNE=1, then defaults. The batch size is capped at what the model
+variant accepts (the INT8 OpenVINO export takes one image per call).
+
+    python autotune.py --model /app/model/yolo11n.pt --latency-budget-ms 800
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from quantization import max_batch_size, uses_torch_threads
+
+logger = logging.getLogger(__name__)
+
+SETTING_ENV = {
+    "intra_threads": "TORCH_INTRA_THREADS",
+    "interop_threads": "TORCH_INTEROP_THREADS",
+    "workers": "INFERENCE_WORKERS",
+    "max_batch_size": "MAX_BATCH_SIZE",
+}
+
+
+def cpu_quota() -> float:
+    """CPUs available to this container (cgroup quota if set, else all cores)."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return float(os.cpu_count() or 1)
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def hardware_key(model_path: str, precision: str) -> str:
+    return f"{_cpu_model()}|cpus={cpu_quota():g}|{os.path.basename(model_path)}|{precision}"
+
+
+def default_cache_path(model_path: str) -> str:
+    return os.environ.get("AUTOTUNE_CACHE") or os.path.join(
+        os.path.dirname(os.path.abspath(model_path)), "autotune.json")
+
+
+def load_cached(cache_path: str, key: str) -> Optional[dict]:
+    try:
+        with open(cache_path) as f:
+            return json.load(f).get(key)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached(cache_path: str, key: str, entry: dict):
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache[key] = entry
+    cache_dir = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(cache_dir, exist_ok=True)
+    # unique temp name: pods sharing the cache volume may save at the same time
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=os.path.basename(cache_path) + ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, cache_path)
+
+
+def default_grid(cpus: float) -> Dict[str, List[int]]:
+    cores = max(1, int(cpus))
+    return {
+        "intra_threads": sorted({1, max(1, cores // 2), cores}),
+        "interop_threads": [1, 2],
+        "workers": sorted({1, min(2, cores)}),
+        "max_batch_size": [1, 2, 4, 8],
+    }
+
+
+def select_best(measurements: List[dict], latency_budget: float) -> dict:
+    """Highest throughput within the latency budget; lowest latency if nothing fits."""
+    within = [m for m in measurements if m["p95_latency"] <= latency_budget]
+    if within:
+        return max(within, key=lambda m: m["throughput"])
+    return min(measurements, key=lambda m: m["p95_latency"])
+
+
+def _benchmark_interop(model_path: str, precision: str, interop: Optional[int], combos: List[dict],
+                       image_size: List[int], batches: int) -> List[dict]:
+    """Measure every combo for one inter-op setting (runs in a fresh process)."""
+    if interop is not None:
+        import torch
+        torch.set_num_interop_threads(interop)
+
+    from api import ModelHandler
+
+    width, height = image_size
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(8)]
+    max_workers = max(c["workers"] for c in combos)
+    models = [ModelHandler(model_path, precision).load() for _ in range(max_workers)]
+    for model in models:
+        model(images[:1], verbose=False)
+
+    measurements = []
+    for combo in combos:
+        if combo["intra_threads"] is not None:
+            torch.set_num_threads(combo["intra_threads"])
+        batch = [images[i % len(images)] for i in range(combo["max_batch_size"])]
+        models[0](batch, verbose=False)  # warm up this batch shape
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def run(model):
+            for _ in range(batches):
+                started = time.perf_counter()
+                model(batch, verbose=False)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+
+        threads = [threading.Thread(target=run, args=(models[i],)) for i in range(combo["workers"])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        measurements.append(dict(
+            combo,
+            interop_threads=interop,
+            throughput=len(latencies) * combo["max_batch_size"] / wall,
+            p95_latency=latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+        ))
+    return measurements
+
+
+def autotune(model_path: str, precision: str = "fp32", latency_budget: float = 1.0,
+             grid: Optional[Dict[str, List[int]]] = None, image_size: Tuple[int, int] = (640, 480),
+             batches: int = 5) -> dict:
+    """Run the grid search and return the chosen entry (settings plus all measurements)."""
+    cpus = cpu_quota()
+    grid = grid or default_grid(cpus)
+    limit = max_batch_size(precision)
+    if limit:
+        grid = dict(grid, max_batch_size=[b for b in grid["max_batch_size"] if b <= limit] or [limit])
+    if not uses_torch_threads(precision):
+        # measuring thread counts that have no effect would only repeat runs
+        grid = dict(grid, intra_threads=[None], interop_threads=[None])
+    combos = [
+        {"intra_threads": intra, "workers": workers, "max_batch_size": batch}
+        for intra, workers, batch in product(grid["intra_threads"], grid["workers"], grid["max_batch_size"])
+        # oversubscribing the quota only adds contention
+        if intra is None or intra * workers <= max(1, int(cpus)) * 2
+    ]
+
+    measurements = []
+    context = multiprocessing.get_context("spawn")
+    for interop in grid["interop_threads"]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            measurements.extend(pool.submit(
+                _benchmark_interop, model_path, precision, interop, combos, list(image_size), batches
+            ).result())
+
+    best = select_best(measurements, latency_budget)
+    return {
+        "settings": {name: best[name] for name in SETTING_ENV},
+        "throughput": best["throughput"],
+        "p95_latency": best["p95_latency"],
+        "latency_budget": latency_budget,
+        "measurements": measurements,
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def resolve_settings(model_path: str, precision: str = "fp32") -> Dict[str, Optional[int]]:
+    """Settings to run with: env overrides, then cached tuning, then a new search if AUTOTUNE=1."""
+    settings: Dict[str, Optional[int]] = {name: None for name in SETTING_ENV}
+
+    cache_path = default_cache_path(model_path)
+    key = hardware_key(model_path, precision)
+    entry = load_cached(cache_path, key)
+    if entry is None and os.environ.get("AUTOTUNE", "0") == "1":
+        budget = float(os.environ.get("AUTOTUNE_LATENCY_BUDGET_MS", "1000")) / 1000
+        entry = autotune(model_path, precision, latency_budget=budget)
+        save_cached(cache_path, key, entry)
+    if entry is not None:
+        settings.update(entry["settings"])
+
+    for name, env in SETTING_ENV.items():
+        if os.environ.get(env):
+            settings[name] = int(os.environ[env])
+
+    limit = max_batch_size(precision)
+    if limit and settings["max_batch_size"] and settings["max_batch_size"] > limit:
+        logger.warning("max_batch_size %d exceeds what the %s model accepts; using %d",
+                       settings["max_batch_size"], precision, limit)
+        settings["max_batch_size"] = limit
+    if not uses_torch_threads(precision) and (settings["intra_threads"] or settings["interop_threads"]):
+        logger.warning("the %s model does not run on torch; ignoring torch thread settings", precision)
+        settings["intra_threads"] = settings["interop_threads"] = None
+    return settings
+
+
+def apply_torch_threads(settings: Dict[str, Optional[int]]):
+    """Apply thread settings; must run before the model does any work."""
+    if settings.get("intra_threads") is None and settings.get("interop_threads") is None:
+        return
+    import torch
+    if settings.get("interop_threads") is not None:
+        torch.set_num_interop_threads(settings["interop_threads"])
+    if settings.get("intra_threads") is not None:
+        torch.set_num_threads(settings["intra_threads"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Autotune torch threads, inference workers and batch size")
+    parser.add_argument("--model", default=os.environ.get("YOLO_MODEL", "yolo11n.pt"))
+    parser.add_argument("--precision", default=os.environ.get("YOLO_PRECISION", "fp32"))
+    parser.add_argument("--latency-budget-ms", type=float, default=1000,
+                        help="Max p95 batch latency for a configuration to be eligible")
+    parser.add_argument("--batches", type=int, default=5, help="Timed batches per worker per configuration")
+    parser.add_argument("--output", help="Cache file to update (default: AUTOTUNE_CACHE or next to the model)")
+    parser.add_argument("--if-missing", action="store_true",
+                        help="Do nothing if this hardware class is already in the cache")
+    args = parser.parse_args()
+
+    output = args.output or default_cache_path(args.model)
+    if args.if_missing and load_cached(output, hardware_key(args.model, args.precision)) is not None:
+        print(f"{hardware_key(args.model, args.precision)} already tuned in {output}")
+        raise SystemExit(0)
+
+    entry = autotune(args.model, args.precision, args.latency_budget_ms / 1000, batches=args.batches)
+    save_cached(output, hardware_key(args.model, args.precision), entry)
+
+    print(f"{'intra':>6} {'inter':>6} {'workers':>8} {'batch':>6} {'img/s':>8} {'p95 (s)':>8}")
+    for m in sorted(entry["measurements"], key=lambda m: -m["throughput"]):
+        # "-": not a torch variant, threads were left to the runtime
+        intra, inter = ("-" if m[k] is None else m[k] for k in ("intra_threads", "interop_threads"))
+        print(f"{intra:>6} {inter:>6} {m['workers']:8} {m['max_batch_size']:6} "
+              f"{m['throughput']:8.2f} {m['p95_latency']:8.3f}")
+    print(f"\nSelected: {entry['settings']} -> {entry['throughput']:.2f} img/s, "
+          f"p95 {entry['p95_latency']:.3f}s")
+    print(f"Written to {output}")
@@ -0,0 +1,143 @@
+"""Micro-batching of inference calls onto a pool of worker threads.
+
+Requests submit a single image source (path or BGR array); each worker pulls
+up to `max_batch_size` queued items, waiting at most `max_wait_ms` for the
+batch to fill, and runs them through the model in one call. Inference no
+longer blocks the event loop, and the number of workers and batch size can be
+tuned per node (see `autotune.py`). Queued items are ordered by priority
+class (see `scheduling.py`).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from scheduling import INTERACTIVE, WeightedFairQueue
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InferenceOutcome:
+    """Result for one submitted source plus where its time went."""
+    result: Any
+    queue_seconds: float
+    inference_seconds: float
+    batch_size: int
+
+
+@dataclass
+class _Item:
+    source: Any
+    request_id: Optional[str]
+    priority: str
+    future: Future
+    enqueued_at: float
+
+
+class InferenceBatcher:
+    def __init__(self, model_handler, workers: int = 1, max_batch_size: int = 1,
+                 max_wait_ms: float = 5.0, profiler=None, scheduler: Optional[WeightedFairQueue] = None):
+        self.model_handler = model_handler
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.profiler = profiler
+        self.scheduler = scheduler or WeightedFairQueue()
+        self._handlers: Dict[int, Any] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def configure(self, workers: Optional[int] = None, max_batch_size: Optional[int] = None,
+                  max_wait_ms: Optional[float] = None):
+        """Change pool settings; only allowed before the first submit starts the workers."""
+        with self._lock:
+            changed = ((workers and workers != self.workers)
+                       or (max_batch_size and max_batch_size != self.max_batch_size)
+                       or (max_wait_ms is not None and max_wait_ms != self.max_wait_ms))
+            if self._threads and changed:
+                raise RuntimeError("batcher already started")
+            if workers:
+                self.workers = workers
+            if max_batch_size:
+                self.max_batch_size = max_batch_size
+            if max_wait_ms is not None:
+                self.max_wait_ms = max_wait_ms
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                t = threading.Thread(target=self._worker, args=(index,), name=f"inference-{index}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _handler(self, index: int):
+        # Ultralytics models are not safe to share between threads, so every
+        # worker past the first gets its own copy of the model.
+        if index == 0:
+            return self.model_handler
+        if index not in self._handlers:
+            self._handlers[index] = type(self.model_handler)(
+                self.model_handler.model_path, self.model_handler.precision)
+        return self._handlers[index]
+
+    def submit(self, source, request_id: Optional[str] = None, priority: str = INTERACTIVE) -> Future:
+        """Queue one source for inference; the future resolves to an `InferenceOutcome`."""
+        self._start()
+        future: Future = Future()
+        self.scheduler.put(_Item(source, request_id, priority, future, time.perf_counter()), priority)
+        return future
+
+    async def infer(self, source, request_id: Optional[str] = None, priority: str = INTERACTIVE) -> InferenceOutcome:
+        return await asyncio.wrap_future(self.submit(source, request_id, priority))
+
+    def _worker(self, index: int):
+        while True:
+            _, batch = self.scheduler.get_batch(self.max_batch_size, self.max_wait_ms / 1000)
+            # drop items whose caller gave up (e.g. a cancelled `infer`); the
+            # rest can no longer be cancelled, so completing them cannot fail
+            batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._run_batch(index, batch)
+            except Exception as e:
+                # never let a batch take the worker thread down with it
+                logger.exception("inference worker %d failed to complete a batch", index)
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+
+    def _run_batch(self, index: int, batch: List[_Item]):
+        started = time.perf_counter()
+        request_ids = [item.request_id for item in batch if item.request_id]
+        try:
+            model = self._handler(index).load()
+            attach = self.profiler.attach(*request_ids) if self.profiler is not None else nullcontext()
+            with attach:
+                results = model([item.source for item in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"model returned {len(results)} results for {len(batch)} inputs")
+        except Exception as e:
+            for item in batch:
+                item.future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        for item, result in zip(batch, results):
+            try:
+                self.scheduler.record(item.priority, started - item.enqueued_at, finished - item.enqueued_at)
+            except Exception:
+                logger.warning("failed to record scheduler stats", exc_info=True)
+            item.future.set_result(InferenceOutcome(
+                result=result,
+                queue_seconds=started - item.enqueued_at,
+                inference_seconds=finished - started,
+                batch_size=len(batch),
+            ))
@@ -0,0 +1,96 @@
+"""Python client for the gRPC inference interface (see `grpc_service.py`).
+
+    client = InferenceClient("localhost:50051")
+    boxes = client.predict(open("cat.jpg", "rb").read())       # (N, 6) float32
+    for boxes in client.predict_stream(images):                # one stream, in order
+        ...
+
+    python grpc_client.py --target localhost:50051 image.jpg [image2.jpg ...]
+"""
+
+import argparse
+import uuid
+from typing import Iterable, Iterator, Optional
+
+import grpc
+import numpy as np
+
+from grpc_service import CHANNEL_OPTIONS, SERVICE, encode_request, unpack_predictions
+
+
+def _identity(data: bytes) -> bytes:
+    return data
+
+
+class InferenceClient:
+    """One persistent HTTP/2 channel; safe to share between threads."""
+
+    def __init__(self, target: str, priority: Optional[str] = None, api_key: Optional[str] = None,
+                 timeout: float = 60.0):
+        self.channel = grpc.insecure_channel(target, options=CHANNEL_OPTIONS)
+        self.timeout = timeout
+        self._metadata = []
+        if priority:
+            self._metadata.append(("x-priority", priority))
+        if api_key:
+            self._metadata.append(("x-api-key", api_key))
+        self._predict = self.channel.unary_unary(
+            f"/{SERVICE}/Predict", request_serializer=_identity, response_deserializer=_identity)
+        self._predict_stream = self.channel.stream_stream(
+            f"/{SERVICE}/PredictStream", request_serializer=_identity, response_deserializer=_identity)
+
+    def _call_metadata(self, request_id: Optional[str]):
+        return self._metadata + [("x-request-id", request_id or uuid.uuid4().hex)]
+
+    def predict(self, image, request_id: Optional[str] = None) -> np.ndarray:
+        """Detections for encoded image bytes or an HxWx3 uint8 BGR array."""
+        response = self._predict(encode_request(image), timeout=self.timeout,
+                                 metadata=self._call_metadata(request_id))
+        return unpack_predictions(response)
+
+    def predict_with_timing(self, image, request_id: Optional[str] = None):
+        """Like `predict`, plus the server's stage breakdown (Server-Timing format)."""
+        response, call = self._predict.with_call(encode_request(image), timeout=self.timeout,
+                                                 metadata=self._call_metadata(request_id))
+        trailers = dict(call.trailing_metadata() or ())
+        return unpack_predictions(response), trailers.get("server-timing", "")
+
+    def predict_stream(self, images: Iterable, request_id: Optional[str] = None) -> Iterator[np.ndarray]:
+        """Stream images over one call; yields detections in input order."""
+        responses = self._predict_stream((encode_request(image) for image in images),
+                                         metadata=self._call_metadata(request_id))
+        for response in responses:
+            yield unpack_predictions(response)
+
+    def close(self):
+        self.channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run images through the gRPC inference service")
+    parser.add_argument("images", nargs="+", help="Image files")
+    parser.add_argument("--target", default="localhost:50051")
+    parser.add_argument("--priority", choices=["interactive", "bulk"])
+    parser.add_argument("--stream", action="store_true", help="Send all images over one stream")
+    args = parser.parse_args()
+
+    payloads = []
+    for path in args.images:
+        with open(path, "rb") as f:
+            payloads.append(f.read())
+
+    with InferenceClient(args.target, priority=args.priority) as client:
+        if args.stream:
+            results = client.predict_stream(payloads)
+        else:
+            results = (client.predict(p) for p in payloads)
+        for path, boxes in zip(args.images, results):
+            print(f"{path}: {len(boxes)} detections")
+            for x1, y1, x2, y2, score, cls in boxes:
+                print(f"  class {int(cls):3d} score {score:.3f} box [{x1:.1f}, {y1:.1f}, {x2:.1f}, {y2:.1f}]")
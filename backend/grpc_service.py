@@ -0,0 +1,218 @@
+"""gRPC inference interface next to the HTTP API.
+
+Skips multipart parsing, JSON and base64: requests carry raw image bytes (or
+an already decoded BGR uint8 tensor) and responses are packed float32 arrays,
+one `x1, y1, x2, y2, score, class` row per detection. Calls go through the same
+`InferenceBatcher` and priority scheduler as `/predict`, so both interfaces
+share the model instances and queue.
+
+Methods of the `yolo.Inference` service (no protobuf, messages are bytes):
+
+- `Predict` (unary): one image in, one prediction array out.
+- `PredictStream` (bidirectional): a client streams images over one
+  persistent HTTP/2 stream and receives prediction arrays in the same order.
+  Images are submitted as they arrive, so a stream fills batches the same way
+  concurrent requests do, up to `max_in_flight` unanswered images per stream;
+  beyond that the server stops reading and HTTP/2 flow control holds the
+  client back.
+
+Request framing: a `<BHH` header (kind, height, width) followed by the
+payload. `ENCODED` carries JPEG/PNG bytes (height/width are ignored);
+`TENSOR` carries `height * width * 3` bytes of HWC BGR uint8 pixels.
+
+Metadata mirrors the HTTP headers: `x-request-id`, `x-priority` and
+`x-api-key` on the way in; `x-request-id` and `server-timing` are sent back as
+trailing metadata on unary calls.
+"""
+
+import itertools
+import logging
+import queue
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Tuple
+
+import grpc
+import numpy as np
+
+from imaging import decode_image
+from timing import StageTimer, resolve_request_id
+
+logger = logging.getLogger(__name__)
+
+SERVICE = "yolo.Inference"
+ENCODED = 0
+TENSOR = 1
+_HEADER = struct.Struct("<BHH")
+# PIL raises OSError subclasses for undecodable images
+_INVALID_IMAGE = (ValueError, OSError)
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+CHANNEL_OPTIONS = [
+    ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+    ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+]
+
+
+def encode_request(image) -> bytes:
+    """Frame encoded image bytes or an HxWx3 uint8 BGR array as a request message."""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return _HEADER.pack(ENCODED, 0, 0) + bytes(image)
+    array = np.ascontiguousarray(image, dtype=np.uint8)
+    if array.ndim != 3 or array.shape[2] != 3:
+        raise ValueError(f"expected an HxWx3 array, got shape {array.shape}")
+    height, width, _ = array.shape
+    return _HEADER.pack(TENSOR, height, width) + array.tobytes()
+
+
+def decode_request(message: bytes) -> np.ndarray:
+    """Inverse of `encode_request`: the BGR array the model takes."""
+    if len(message) < _HEADER.size:
+        raise ValueError("message shorter than header")
+    kind, height, width = _HEADER.unpack_from(message)
+    payload = memoryview(message)[_HEADER.size:]
+    if kind == ENCODED:
+        return decode_image(bytes(payload))
+    if kind == TENSOR:
+        if len(payload) != height * width * 3:
+            raise ValueError(f"tensor payload is {len(payload)} bytes, expected {height}x{width}x3")
+        return np.frombuffer(payload, dtype=np.uint8).reshape(height, width, 3)
+    raise ValueError(f"unknown request kind {kind}")
+
+
+def pack_predictions(predictions: List[dict]) -> bytes:
+    rows = [p["xyxy"] + [p["score"], p["class"]] for p in predictions]
+    return np.asarray(rows, dtype=np.float32).reshape(-1, 6).tobytes()
+
+
+def unpack_predictions(message: bytes) -> np.ndarray:
+    """(N, 6) float32 array of `x1, y1, x2, y2, score, class` rows."""
+    return np.frombuffer(message, dtype=np.float32).reshape(-1, 6)
+
+
+def _identity(data: bytes) -> bytes:
+    return data
+
+
+class InferenceServicer:
+    """Serves `yolo.Inference` from the shared batcher.
+
+    `to_predictions` turns a list of Ultralytics results into the `/predict`
+    JSON payload; `priority_for` maps request headers/metadata to a priority
+    class. `max_in_flight` bounds the decoded images a single stream may have
+    queued or running at once.
+    """
+
+    def __init__(self, batcher, to_predictions: Callable, priority_for: Callable, profiler=None,
+                 max_in_flight: int = 16):
+        self.batcher = batcher
+        self.to_predictions = to_predictions
+        self.priority_for = priority_for
+        self.profiler = profiler
+        self.max_in_flight = max_in_flight
+
+    def _submit(self, message: bytes, request_id: str, priority: str):
+        return self.batcher.submit(decode_request(message), request_id=request_id, priority=priority)
+
+    def _pack(self, outcome) -> bytes:
+        return pack_predictions(self.to_predictions([outcome.result])["predictions"])
+
+    def Predict(self, request: bytes, context) -> bytes:
+        metadata = dict(context.invocation_metadata())
+        timer = StageTimer(resolve_request_id(metadata.get("x-request-id")))
+        try:
+            with timer.stage("decode"):
+                future = self._submit(request, timer.request_id, self.priority_for(metadata))
+        except _INVALID_IMAGE as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"invalid image: {e}")
+        try:
+            outcome = future.result()
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, str(e))
+        timer.record("queue", outcome.queue_seconds)
+        timer.record("inference", outcome.inference_seconds)
+        with timer.stage("postprocess"):
+            response = self._pack(outcome)
+
+        total = timer.elapsed()
+        if self.profiler is not None:
+            self.profiler.complete(timer.request_id, total)
+        context.set_trailing_metadata((
+            ("x-request-id", timer.request_id),
+            ("server-timing", timer.server_timing(total)),
+        ))
+        return response
+
+    def PredictStream(self, request_iterator, context) -> Iterator[bytes]:
+        metadata = dict(context.invocation_metadata())
+        stream_id = resolve_request_id(metadata.get("x-request-id"))
+        priority = self.priority_for(metadata)
+        pending: "queue.Queue" = queue.Queue()
+        # a slot per unanswered image, taken before reading the next message
+        in_flight = threading.Semaphore(self.max_in_flight)
+        finished = threading.Event()
+
+        # Read and submit on a separate thread so requests keep flowing into
+        # the batcher while earlier responses are still being written, and
+        # clients that wait for each response before sending the next work too.
+        def read():
+            try:
+                messages = iter(request_iterator)
+                for index in itertools.count():
+                    while not in_flight.acquire(timeout=0.5):
+                        if finished.is_set() or not context.is_active():
+                            return
+                    message = next(messages, None)
+                    if message is None:
+                        return
+                    try:
+                        pending.put((index, self._submit(message, f"{stream_id}:{index}", priority), None))
+                    except _INVALID_IMAGE as e:
+                        pending.put((index, None, str(e)))
+                        return
+            except Exception:
+                logger.debug("gRPC stream %s closed while reading", stream_id, exc_info=True)
+            finally:
+                pending.put(None)
+
+        threading.Thread(target=read, name=f"grpc-stream-{stream_id[:8]}", daemon=True).start()
+        try:
+            while True:
+                entry = pending.get()
+                if entry is None:
+                    return
+                index, future, error = entry
+                if error is not None:
+                    context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"invalid image at index {index}: {error}")
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    context.abort(grpc.StatusCode.INTERNAL, f"inference failed at index {index}: {e}")
+                yield self._pack(outcome)
+                in_flight.release()
+        finally:
+            # stops a reader still waiting for a slot
+            finished.set()
+
+    def handler(self) -> grpc.GenericRpcHandler:
+        return grpc.method_handlers_generic_handler(SERVICE, {
+            "Predict": grpc.unary_unary_rpc_method_handler(
+                self.Predict, request_deserializer=_identity, response_serializer=_identity),
+            "PredictStream": grpc.stream_stream_rpc_method_handler(
+                self.PredictStream, request_deserializer=_identity, response_serializer=_identity),
+        })
+
+
+def start_server(servicer: InferenceServicer, port: int, max_workers: int = 32) -> Tuple[grpc.Server, int]:
+    """Start serving on `port` (0 picks a free one); returns the server and bound port.
+
+    Every in-flight unary call and open stream holds one of `max_workers`
+    threads while it waits on the batcher.
+    """
+    server = grpc.server(ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="grpc"),
+                         options=CHANNEL_OPTIONS)
+    server.add_generic_rpc_handlers((servicer.handler(),))
+    bound = server.add_insecure_port(f"[::]:{port}")
+    server.start()
+    logger.info("gRPC inference service listening on port %d", bound)
+    return server, bound
@@ -0,0 +1,12 @@
+"""Image decoding shared by the HTTP, job and gRPC paths."""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """Decode uploaded bytes into the BGR array Ultralytics expects."""
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    return np.ascontiguousarray(np.asarray(img)[:, :, ::-1])
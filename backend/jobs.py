@@ -0,0 +1,345 @@
+"""Durable asynchronous inference jobs.
+
+`POST /jobs` stores the uploaded images in a local SQLite database and
+returns immediately; a pool of job workers claims pending images in batches,
+runs them through the shared `InferenceBatcher` and stores the predictions
+(zlib-compressed JSON, image bytes dropped). Finished jobs are garbage
+collected after a TTL. Items left `running` by a crash are re-queued when the
+store is opened.
+
+Each replica has its own store. With an `owner` (the replica's stable name,
+e.g. a StatefulSet pod), job IDs are `<owner>.<hex>` so any replica can tell
+which one holds a job and forward lookups to it. A replica that is shutting
+down for good hands its jobs to another one with `export` / `adopt`.
+"""
+
+import base64
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from imaging import decode_image
+from scheduling import BULK
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    filename TEXT,
+    status TEXT NOT NULL,
+    image BLOB,
+    result BLOB,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+
+
+# owner must be a DNS label: it is substituted into the peer URL
+_OWNER = re.compile(r"[a-z0-9](?:[-a-z0-9]{0,61}[a-z0-9])?")
+_JOB_ID = re.compile(rf"(?:({_OWNER.pattern})\.)?[0-9a-f]{{32}}")
+_JOB_COLUMNS = ("id", "status", "total", "done", "failed", "created_at", "finished_at")
+_ITEM_COLUMNS = ("idx", "filename", "status", "image", "result", "error")
+
+
+def valid_owner(owner: str) -> bool:
+    return bool(_OWNER.fullmatch(owner))
+
+
+def job_owner(job_id: str) -> Optional[str]:
+    """Owner encoded in `job_id`, or None for unprefixed or malformed IDs."""
+    match = _JOB_ID.fullmatch(job_id)
+    return match.group(1) if match else None
+
+
+def _pack(predictions: List[dict]) -> bytes:
+    compact = [
+        [round(v, 1) for v in p["xyxy"]] + [round(p["score"], 4), p["class"]]
+        for p in predictions
+    ]
+    return zlib.compress(json.dumps(compact, separators=(",", ":")).encode())
+
+
+def _unpack(blob: bytes) -> List[dict]:
+    return [
+        {"xyxy": row[:4], "score": row[4], "class": row[5]}
+        for row in json.loads(zlib.decompress(blob))
+    ]
+
+
+class JobStore:
+    def __init__(self, path: str, owner: Optional[str] = None):
+        if owner and not valid_owner(owner):
+            raise ValueError(f"job owner {owner!r} is not a lowercase DNS label")
+        self.path = path
+        self.owner = owner
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending = threading.Condition(self._lock)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            # anything claimed by a previous process never finished
+            conn.execute("UPDATE items SET status = 'pending' WHERE status = 'running'")
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def create(self, files: Iterable[Tuple[str, bytes]]) -> str:
+        """Store a job; `files` is consumed lazily, so only one image needs to be in memory."""
+        job_id = f"{self.owner}.{uuid.uuid4().hex}" if self.owner else uuid.uuid4().hex
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                total = conn.executemany(
+                    "INSERT INTO items (job_id, idx, filename, status, image) VALUES (?, ?, ?, 'pending', ?)",
+                    ((job_id, idx, filename, data) for idx, (filename, data) in enumerate(files)),
+                ).rowcount
+                conn.execute(
+                    "INSERT INTO jobs (id, status, total, created_at) VALUES (?, 'queued', ?, ?)",
+                    (job_id, total, time.time()),
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            self._pending.notify_all()
+        return job_id
+
+    def claim(self, limit: int, timeout: float) -> List[Tuple[str, int, bytes]]:
+        """Mark up to `limit` pending items as running, waiting up to `timeout` for work."""
+        with self._lock:
+            conn = self._connect()
+            rows = self._claim_locked(conn, limit)
+            if not rows:
+                self._pending.wait(timeout)
+                rows = self._claim_locked(conn, limit)
+            return rows
+
+    def _claim_locked(self, conn, limit: int):
+        rows = conn.execute(
+            "SELECT job_id, idx, image FROM items WHERE status = 'pending' ORDER BY rowid LIMIT ?",
+            (limit,),
+        ).fetchall()
+        if rows:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE items SET status = 'running' WHERE job_id = ? AND idx = ?",
+                [(job_id, idx) for job_id, idx, _ in rows],
+            )
+            conn.executemany(
+                "UPDATE jobs SET status = 'running' WHERE id = ? AND status = 'queued'",
+                {(job_id,) for job_id, _, _ in rows},
+            )
+            conn.execute("COMMIT")
+        return rows
+
+    def finish(self, job_id: str, idx: int, predictions: Optional[List[dict]] = None,
+               error: Optional[str] = None):
+        """Store an item's result (or error), drop its image and close the job when all items are in."""
+        failed = error is not None
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            conn.execute(
+                "UPDATE items SET status = ?, image = NULL, result = ?, error = ? WHERE job_id = ? AND idx = ?",
+                ("failed" if failed else "done", None if failed else _pack(predictions), error, job_id, idx),
+            )
+            conn.execute(
+                f"UPDATE jobs SET {'failed = failed' if failed else 'done = done'} + 1 WHERE id = ?",
+                (job_id,),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'completed', finished_at = ? WHERE id = ? AND done + failed >= total",
+                (time.time(), job_id),
+            )
+            conn.execute("COMMIT")
+
+    def get(self, job_id: str, include_results: bool = True) -> Optional[dict]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(zip(_JOB_COLUMNS, row))
+            if include_results:
+                items = conn.execute(
+                    "SELECT idx, filename, status, result, error FROM items "
+                    "WHERE job_id = ? AND status IN ('done', 'failed') ORDER BY idx",
+                    (job_id,),
+                ).fetchall()
+                job["results"] = [
+                    {"index": idx, "filename": filename, "status": status,
+                     **({"predictions": _unpack(result)} if status == "done" else {"error": error})}
+                    for idx, filename, status, result, error in items
+                ]
+            return job
+
+    def export(self) -> Iterator[dict]:
+        """Yield every stored job with its items as JSON-ready dicts, oldest first.
+
+        Blobs are base64 encoded; items claimed but not finished are exported
+        as pending so the receiving store runs them again.
+        """
+        with self._lock:
+            job_ids = [r[0] for r in self._connect().execute("SELECT id FROM jobs ORDER BY created_at")]
+        for job_id in job_ids:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    continue
+                items = conn.execute(
+                    f"SELECT {', '.join(_ITEM_COLUMNS)} FROM items WHERE job_id = ? ORDER BY idx", (job_id,),
+                ).fetchall()
+            job = dict(zip(_JOB_COLUMNS, row))
+            job["items"] = [
+                {"idx": idx, "filename": filename, "status": "pending" if status == "running" else status,
+                 "image": base64.b64encode(image).decode() if image is not None else None,
+                 "result": base64.b64encode(result).decode() if result is not None else None,
+                 "error": error}
+                for idx, filename, status, image, result, error in items
+            ]
+            yield job
+
+    def adopt(self, job: dict):
+        """Store a job exported by another replica under its original ID, replacing any earlier copy."""
+        items = [
+            (job["id"], item["idx"], item["filename"], item["status"],
+             base64.b64decode(item["image"]) if item["image"] is not None else None,
+             base64.b64decode(item["result"]) if item["result"] is not None else None,
+             item["error"])
+            for item in job["items"]
+        ]
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM items WHERE job_id = ?", (job["id"],))
+                conn.executemany(f"INSERT INTO items (job_id, {', '.join(_ITEM_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 items)
+                conn.execute(f"INSERT OR REPLACE INTO jobs ({', '.join(_JOB_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             tuple(job[c] for c in _JOB_COLUMNS))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            self._pending.notify_all()
+
+    def delete(self, job_id: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM items WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            conn.execute("COMMIT")
+
+    def purge(self, ttl_seconds: float) -> int:
+        """Delete jobs that finished more than `ttl_seconds` ago; returns how many."""
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            expired = [r[0] for r in conn.execute(
+                "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))]
+            conn.executemany("DELETE FROM items WHERE job_id = ?", [(j,) for j in expired])
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(j,) for j in expired])
+            conn.execute("COMMIT")
+        return len(expired)
+
+
+class JobWorkerPool:
+    """Drains the job store through the shared inference batcher."""
+
+    def __init__(self, store: JobStore, batcher, to_predictions: Callable, workers: int = 1,
+                 batch_size: int = 8, ttl_seconds: float = 3600, gc_interval: float = 60):
+        self.store = store
+        self.batcher = batcher
+        self.to_predictions = to_predictions
+        self.workers = workers
+        self.batch_size = batch_size
+        self.ttl_seconds = ttl_seconds
+        self.gc_interval = gc_interval
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        self._stop.clear()
+        for index in range(self.workers):
+            t = threading.Thread(target=self._drain, name=f"job-worker-{index}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._collect_garbage, name="job-gc", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _drain(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.store.claim(self.batch_size, timeout=1.0)
+            except Exception:
+                logger.exception("failed to claim job items")
+                self._stop.wait(1.0)
+                continue
+
+            submitted = []
+            for job_id, idx, data in claimed:
+                try:
+                    future = self.batcher.submit(decode_image(data), request_id=f"job:{job_id}:{idx}", priority=BULK)
+                except Exception as e:
+                    self.store.finish(job_id, idx, error=f"invalid image: {e}")
+                    continue
+                submitted.append((job_id, idx, future))
+
+            for job_id, idx, future in submitted:
+                try:
+                    outcome = future.result()
+                    predictions = self.to_predictions([outcome.result])["predictions"]
+                except Exception as e:
+                    self.store.finish(job_id, idx, error=str(e))
+                else:
+                    self.store.finish(job_id, idx, predictions=predictions)
+
+    def _collect_garbage(self):
+        while not self._stop.wait(self.gc_interval):
+            try:
+                purged = self.store.purge(self.ttl_seconds)
+                if purged:
+                    logger.info("purged %d expired jobs", purged)
+            except Exception:
+                logger.exception("job garbage collection failed")
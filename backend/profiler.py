@@ -0,0 +1,195 @@
+"""Low-overhead sampling profiler for the live backend process.
+
+Samples the Python stack of every thread via `sys._current_frames()` at a
+fixed interval and aggregates identical stacks. Output is either the
+collapsed-stack format understood by flamegraph.pl / speedscope / inferno,
+or a speedscope JSON document with one sampled profile per thread.
+
+With `min_duration` set, only samples taken while a request was attached to
+a thread (see `attach`) are kept, and only for requests whose total duration
+reached the threshold (see `complete`).
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+Frame = Tuple[str, str, int]  # (function, filename, first line)
+Stack = Tuple[Frame, ...]
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profiling session is already running."""
+
+
+class _Segment:
+    """Samples collected on one thread while a set of requests was attached."""
+
+    __slots__ = ("thread_name", "counts", "committed")
+
+    def __init__(self, thread_name: str):
+        self.thread_name = thread_name
+        self.counts: Counter = Counter()
+        self.committed = False
+
+
+def _frame_label(frame: Frame) -> str:
+    name, filename, line = frame
+    short = os.sep.join(filename.split(os.sep)[-2:])
+    # ';' separates frames in the collapsed format
+    return f"{name} ({short}:{line})".replace(";", ":")
+
+
+def _walk(frame) -> Stack:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._session_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._active = False
+        self._min_duration: Optional[float] = None
+        self._thread_segments: Dict[int, _Segment] = {}
+        self._request_segments: Dict[str, List[_Segment]] = {}
+        self._counts: Counter = Counter()
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    @contextmanager
+    def attach(self, *request_ids: str):
+        """Attribute samples on the current thread to `request_ids` (slow-request mode only).
+
+        The block must not yield to the event loop, otherwise samples from
+        other requests interleaved on the same thread would be attributed too.
+        """
+        if not self._active or self._min_duration is None:
+            yield
+            return
+        ident = threading.get_ident()
+        segment = _Segment(threading.current_thread().name)
+        with self._state_lock:
+            self._thread_segments[ident] = segment
+            for request_id in request_ids:
+                self._request_segments.setdefault(request_id, []).append(segment)
+        try:
+            yield
+        finally:
+            with self._state_lock:
+                if self._thread_segments.get(ident) is segment:
+                    del self._thread_segments[ident]
+
+    def complete(self, request_id: str, duration: float):
+        """Keep the request's samples if it was slower than the threshold, else drop them."""
+        if not self._active or self._min_duration is None:
+            return
+        with self._state_lock:
+            segments = self._request_segments.pop(request_id, [])
+            if duration < self._min_duration:
+                return
+            for segment in segments:
+                if segment.committed:
+                    continue
+                segment.committed = True
+                for stack, count in segment.counts.items():
+                    self._counts[(segment.thread_name, stack)] += count
+
+    def profile(self, seconds: float, interval: float = 0.01,
+                min_duration: Optional[float] = None) -> Counter:
+        """Sample all threads for `seconds`; returns {(thread_name, stack): samples}."""
+        if not self._session_lock.acquire(blocking=False):
+            raise ProfilerBusy("a profiling session is already running")
+        try:
+            with self._state_lock:
+                self._counts = Counter()
+                self._thread_segments = {}
+                self._request_segments = {}
+                self._min_duration = min_duration
+            self._active = True
+
+            own_ident = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                frames = sys._current_frames()
+                with self._state_lock:
+                    for ident, frame in frames.items():
+                        if ident == own_ident:
+                            continue
+                        if min_duration is None:
+                            self._counts[(names.get(ident, str(ident)), _walk(frame))] += 1
+                        else:
+                            segment = self._thread_segments.get(ident)
+                            if segment is not None:
+                                segment.counts[_walk(frame)] += 1
+                del frames
+                time.sleep(interval)
+
+            with self._state_lock:
+                return self._counts
+        finally:
+            self._active = False
+            with self._state_lock:
+                self._min_duration = None
+                self._thread_segments = {}
+                self._request_segments = {}
+            self._session_lock.release()
+
+
+def to_collapsed(counts: Counter) -> str:
+    """Render samples as `thread;frame;...;leaf count` lines."""
+    lines = []
+    for (thread_name, stack), count in sorted(counts.items(), key=lambda kv: -kv[1]):
+        frames = [thread_name.replace(";", ":")] + [_frame_label(f) for f in stack]
+        lines.append(f"{';'.join(frames)} {count}")
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def to_speedscope(counts: Counter, name: str = "yolo-backend", interval: float = 0.01) -> dict:
+    """Render samples as a speedscope file with one sampled profile per thread."""
+    frame_index: Dict[Frame, int] = {}
+    frames = []
+    by_thread: Dict[str, Tuple[list, list]] = {}
+
+    for (thread_name, stack), count in counts.items():
+        indices = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            indices.append(frame_index[frame])
+        samples, weights = by_thread.setdefault(thread_name, ([], []))
+        samples.append(indices)
+        weights.append(count * interval)
+
+    profiles = []
+    for thread_name, (samples, weights) in sorted(by_thread.items()):
+        profiles.append({
+            "type": "sampled",
+            "name": thread_name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        })
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+        "name": name,
+        "exporter": "yolo-backend-profiler",
+    }
@@ -0,0 +1,148 @@
+"""Reduced-precision model variants and detection parity checks.
+
+YOLO11 is almost entirely convolutional, and PyTorch dynamic quantization only
+covers Linear/RNN layers, so it leaves the model unchanged. The INT8 variant
+is instead produced with Ultralytics' OpenVINO export, which runs NNCF
+post-training (static) quantization on a small calibration set. The exported
+model directory is cached next to the weights (or in `YOLO_QUANT_CACHE`) and
+reused on later starts. The export has a static batch-1 input, so the INT8
+variant is served one image per model call (see `max_batch_size`), and it
+runs on OpenVINO, which ignores torch thread settings (see
+`uses_torch_threads`).
+
+Export ahead of time (e.g. in CI or an init container):
+
+    python quantization.py --model /app/model/yolo11n.pt --precision int8
+"""
+
+import argparse
+import os
+import shutil
+from typing import Dict, List, Optional
+
+PRECISIONS = ("fp32", "int8")
+# OpenVINO exports have a static input shape; a larger batch fails at inference
+_STATIC_BATCH = {"int8": 1}
+# variants not listed run on OpenVINO, which manages its own threads
+_TORCH_PRECISIONS = ("fp32",)
+
+
+def variant_path(model_path: str, precision: str, cache_dir: str = None) -> str:
+    """Where the cached variant of `model_path` for `precision` lives."""
+    if precision == "fp32":
+        return model_path
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    cache_dir = cache_dir or os.environ.get("YOLO_QUANT_CACHE") or os.path.dirname(os.path.abspath(model_path))
+    return os.path.join(cache_dir, f"{stem}_{precision}_openvino_model")
+
+
+def max_batch_size(precision: str) -> Optional[int]:
+    """Largest batch the variant for `precision` accepts, or None if unlimited."""
+    return _STATIC_BATCH.get(precision)
+
+
+def uses_torch_threads(precision: str) -> bool:
+    """Whether torch intra/inter-op thread counts affect the variant for `precision`."""
+    return precision in _TORCH_PRECISIONS
+
+
+def prepare_variant(model_path: str, precision: str, cache_dir: str = None,
+                    data: str = None, imgsz: int = 640) -> str:
+    """Return a loadable path for the requested precision, exporting it if not cached."""
+    if precision not in PRECISIONS:
+        raise RuntimeError(f"unsupported YOLO_PRECISION {precision!r}; expected one of {', '.join(PRECISIONS)}")
+    target = variant_path(model_path, precision, cache_dir)
+    if precision == "fp32" or os.path.isdir(target):
+        return target
+
+    try:
+        from ultralytics import YOLO
+    except Exception as e:
+        raise RuntimeError("ultralytics package is required for inference: pip install ultralytics") from e
+
+    data = data or os.environ.get("YOLO_QUANT_DATA", "coco8.yaml")
+    # Ultralytics writes `<stem>_int8_openvino_model/` next to the weights
+    exported = YOLO(model_path).export(format="openvino", int8=True, data=data, imgsz=imgsz)
+    exported = str(exported).rstrip(os.sep)
+    if os.path.abspath(exported) != os.path.abspath(target):
+        # replicas sharing a cache volume may export concurrently: stage next to
+        # the target, then rename so readers only ever see a complete directory
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        staging = f"{target}.tmp-{os.getpid()}"
+        shutil.move(exported, staging)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            if not os.path.isdir(target):
+                raise
+            shutil.rmtree(staging)  # another replica published first
+    return target
+
+
+def _iou(a: List[float], b: List[float]) -> float:
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_detections(reference: List[dict], candidate: List[dict], iou_threshold: float = 0.5) -> Dict[str, float]:
+    """Greedily match candidate detections to reference ones of the same class.
+
+    Both arguments are `predictions` lists as returned by `/predict`.
+    """
+    unmatched = sorted(candidate, key=lambda p: -p["score"])
+    matched = 0
+    ious = []
+    score_deltas = []
+    for ref in sorted(reference, key=lambda p: -p["score"]):
+        best, best_iou = None, iou_threshold
+        for cand in unmatched:
+            if cand["class"] != ref["class"]:
+                continue
+            iou = _iou(ref["xyxy"], cand["xyxy"])
+            if iou >= best_iou:
+                best, best_iou = cand, iou
+        if best is not None:
+            unmatched.remove(best)
+            matched += 1
+            ious.append(best_iou)
+            score_deltas.append(best["score"] - ref["score"])
+
+    return {
+        "reference": len(reference),
+        "candidate": len(candidate),
+        "matched": matched,
+        "iou_sum": sum(ious),
+        "score_delta_sum": sum(score_deltas),
+    }
+
+
+def summarize_parity(matches: List[Dict[str, float]]) -> Dict[str, float]:
+    """Aggregate per-image `match_detections` results into recall/precision/IoU."""
+    reference = sum(m["reference"] for m in matches)
+    candidate = sum(m["candidate"] for m in matches)
+    matched = sum(m["matched"] for m in matches)
+    return {
+        "images": len(matches),
+        "reference_detections": reference,
+        "candidate_detections": candidate,
+        "matched": matched,
+        "recall": matched / reference if reference else 1.0,
+        "precision": matched / candidate if candidate else 1.0,
+        "mean_iou": sum(m["iou_sum"] for m in matches) / matched if matched else 0.0,
+        "mean_score_delta": sum(m["score_delta_sum"] for m in matches) / matched if matched else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and cache a reduced-precision YOLO variant")
+    parser.add_argument("--model", default=os.environ.get("YOLO_MODEL", "yolo11n.pt"))
+    parser.add_argument("--precision", default="int8", choices=PRECISIONS)
+    parser.add_argument("--cache-dir", help="Directory for the exported model (default: next to weights)")
+    parser.add_argument("--data", help="Calibration dataset yaml (default: YOLO_QUANT_DATA or coco8.yaml)")
+    parser.add_argument("--imgsz", type=int, default=640)
+    args = parser.parse_args()
+
+    print(prepare_variant(args.model, args.precision, args.cache_dir, args.data, args.imgsz))
@@ -0,0 +1,139 @@
+"""Priority classes and weighted fair scheduling in front of the model.
+
+Each priority class has its own FIFO. Workers always take the most important
+non-empty class, so queued bulk work never delays an interactive request by
+more than the batch already running. To keep bulk from starving, a class
+with a guaranteed minimum share earns credit for every item dispatched while
+it has work waiting, and is served first once it has earned a whole item.
+Credit is only earned while the class is backlogged and is dropped when its
+queue empties, so a burst arriving after a quiet stretch does not jump ahead
+to catch up on a share it never asked for.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+
+
+def parse_api_keys(spec: str) -> Dict[str, str]:
+    """Parse `key:class,key2:class` (as in PRIORITY_API_KEYS) into a lookup."""
+    keys = {}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        key, _, priority = entry.rpartition(":")
+        if key and priority in PRIORITY_CLASSES:
+            keys[key] = priority
+    return keys
+
+
+def _p95(values: Sequence[float]) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+
+class _ClassStats:
+    def __init__(self, window: int):
+        self.served = 0
+        self.waits: Deque[float] = deque(maxlen=window)
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+
+class WeightedFairQueue:
+    def __init__(self, classes: Sequence[str] = PRIORITY_CLASSES,
+                 min_shares: Optional[Dict[str, float]] = None, window: int = 200):
+        self.classes = list(classes)
+        self.min_shares = dict(min_shares if min_shares is not None else {BULK: 0.1})
+        self._queues: Dict[str, Deque[Any]] = {c: deque() for c in self.classes}
+        self._recent: Deque[str] = deque(maxlen=window)
+        self._credit: Dict[str, float] = {c: 0.0 for c in self.min_shares}
+        self._stats = {c: _ClassStats(window) for c in self.classes}
+        self._cond = threading.Condition()
+
+    def put(self, item: Any, priority: str):
+        if priority not in self._queues:
+            raise ValueError(f"unknown priority class {priority!r}")
+        with self._cond:
+            self._queues[priority].append(item)
+            # also wakes a worker filling a lower-priority batch so it can stop early
+            self._cond.notify_all()
+
+    def _pick(self) -> Optional[str]:
+        waiting = [c for c in self.classes if self._queues[c]]
+        if not waiting:
+            return None
+        for c in self._credit:
+            if not self._queues[c]:
+                self._credit[c] = 0.0
+        for c in waiting:
+            # tolerance: ten credits of 0.1 sum to just under 1.0
+            if self.min_shares.get(c, 0.0) and self._credit[c] >= 1.0 - 1e-9:
+                return c
+        return waiting[0]
+
+    def _charge(self, priority: str, count: int):
+        """Credit each backlogged class `share` per dispatched item; its own items cost one."""
+        for c, share in self.min_shares.items():
+            if not share:
+                continue
+            if c == priority:
+                self._credit[c] -= (1.0 - share) * count
+            elif self._queues[c]:
+                self._credit[c] += share * count
+
+    def get_batch(self, max_size: int, max_wait: float) -> Tuple[str, List[Any]]:
+        """Block for work, then return up to `max_size` items from one class.
+
+        Waits up to `max_wait` seconds for the batch to fill, but stops early if
+        a more important class gets work in the meantime.
+        """
+        with self._cond:
+            priority = self._pick()
+            while priority is None:
+                self._cond.wait()
+                priority = self._pick()
+            queue = self._queues[priority]
+            batch = [queue.popleft()]
+            deadline = time.monotonic() + max_wait
+            rank = self.classes.index(priority)
+            while len(batch) < max_size:
+                if queue:
+                    batch.append(queue.popleft())
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or any(self._queues[c] for c in self.classes[:rank]):
+                    break
+                self._cond.wait(remaining)
+            self._charge(priority, len(batch))
+            self._recent.extend([priority] * len(batch))
+            self._stats[priority].served += len(batch)
+            return priority, batch
+
+    def record(self, priority: str, wait: float, latency: float):
+        """Record a finished item's queue wait and end-to-end latency."""
+        with self._cond:
+            stats = self._stats[priority]
+            stats.waits.append(wait)
+            stats.latencies.append(latency)
+
+    def stats(self) -> Dict[str, dict]:
+        with self._cond:
+            total = len(self._recent)
+            return {
+                c: {
+                    "queue_depth": len(self._queues[c]),
+                    "served": self._stats[c].served,
+                    "recent_share": self._recent.count(c) / total if total else 0.0,
+                    "min_share": self.min_shares.get(c, 0.0),
+                    "wait_mean_ms": round(1000 * sum(self._stats[c].waits) / len(self._stats[c].waits), 3)
+                    if self._stats[c].waits else 0.0,
+                    "wait_p95_ms": round(1000 * _p95(self._stats[c].waits), 3),
+                    "latency_p95_ms": round(1000 * _p95(self._stats[c].latencies), 3),
+                }
+                for c in self.classes
+            }
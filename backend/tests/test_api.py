@@ -1,8 +1,10 @@
 import os
 import sys
+import tempfile
 from fastapi.testclient import TestClient
 
 import pytest
+from PIL import Image
 
 # Ensure backend package dir is on sys.path when running tests from inside backend/
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -34,7 +36,10 @@ class FakeResult:
     def __init__(self):
         self.boxes = [FakeBox()]
 
-    def plot(self, save: str):
+    def plot(self, save: str = None):
+        # returns nothing, so _annotate falls back to saving to a file
+        if save is None:
+            return None
         with open(save, "wb") as f:
             f.write(b"FAKE_IMAGE")
 
@@ -44,6 +49,10 @@ class FakeModel:
         return [FakeResult()]
 
 
+def _write_jpeg(path):
+    Image.new("RGB", (32, 24), (120, 30, 200)).save(path, format="JPEG")
+
+
 @pytest.fixture(autouse=True)
 def fake_model(monkeypatch):
     # replace actual model with fake one for tests
@@ -62,7 +71,7 @@ def test_health():
 def test_predict_basic(tmp_path):
     client = TestClient(app)
     img = tmp_path / "img.jpg"
-    img.write_bytes(b"$$fakejpg$$")
+    _write_jpeg(img)
 
     with open(img, "rb") as f:
         r = client.post("/predict", files={"file": ("img.jpg", f, "image/jpeg")})
@@ -76,7 +85,7 @@ def test_predict_basic(tmp_path):
 def test_predict_with_image(tmp_path):
     client = TestClient(app)
     img = tmp_path / "img.jpg"
-    img.write_bytes(b"$$fakejpg$$")
+    _write_jpeg(img)
 
     with open(img, "rb") as f:
         r = client.post("/predict?return_image=true", files={"file": ("img.jpg", f, "image/jpeg")})
@@ -86,8 +95,63 @@ def test_predict_with_image(tmp_path):
     assert "image" in j
 
 
+def test_predict_rejects_invalid_image(tmp_path):
+    client = TestClient(app)
+    r = client.post("/predict", files={"file": ("img.jpg", b"not an image", "image/jpeg")})
+    assert r.status_code == 400
+
+
+def test_predictions_include_class_names():
+    from api import _preds_to_json
+
+    result = FakeResult()
+    result.names = {0: "person", 1: "bicycle"}
+    assert _preds_to_json([result])["predictions"][0]["name"] == "bicycle"
+    assert "name" not in _preds_to_json([FakeResult()])["predictions"][0]
+
+
 def test_get_frontend():
     client = TestClient(app)
     r = client.get("/")
     # Frontend is now served separately (Gradio). Backend may return 404 here.
     assert r.status_code in (200, 404)
+
+
+def test_predict_server_timing_and_request_id(tmp_path):
+    client = TestClient(app)
+    img = tmp_path / "img.jpg"
+    _write_jpeg(img)
+
+    with open(img, "rb") as f:
+        r = client.post("/predict", files={"file": ("img.jpg", f, "image/jpeg")},
+                        headers={"X-Request-ID": "trace-123"})
+
+    assert r.status_code == 200
+    assert r.headers["X-Request-ID"] == "trace-123"
+    metrics = [m.split(";")[0].strip() for m in r.headers["Server-Timing"].split(",")]
+    for stage in ("upload", "decode", "inference", "total"):
+        assert stage in metrics
+
+
+def test_request_id_generated_when_missing_or_invalid():
+    client = TestClient(app)
+    r = client.get("/health", headers={"X-Request-ID": "bad id\twith spaces"})
+    assert r.status_code == 200
+    assert r.headers["X-Request-ID"] != "bad id\twith spaces"
+    assert len(r.headers["X-Request-ID"]) == 32
+
+
+def test_predict_leaves_no_temp_files(tmp_path, monkeypatch):
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(scratch))
+    client = TestClient(app)
+    img = tmp_path / "img.jpg"
+    _write_jpeg(img)
+
+    for query in ("", "?return_image=true"):
+        with open(img, "rb") as f:
+            r = client.post(f"/predict{query}", files={"file": ("img.jpg", f, "image/jpeg")})
+        assert r.status_code == 200
+
+    assert list(scratch.iterdir()) == []
@@ -0,0 +1,107 @@
+import os
+import sys
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import autotune
+
+
+def _m(throughput, p95, **settings):
+    base = {"intra_threads": 1, "interop_threads": 1, "workers": 1, "max_batch_size": 1}
+    base.update(settings)
+    return dict(base, throughput=throughput, p95_latency=p95)
+
+
+def test_select_best_respects_latency_budget():
+    measurements = [
+        _m(10, 0.2, max_batch_size=1),
+        _m(25, 0.6, max_batch_size=4),
+        _m(40, 1.5, max_batch_size=8),
+    ]
+    assert autotune.select_best(measurements, 1.0)["max_batch_size"] == 4
+    # nothing fits: fall back to the lowest latency
+    assert autotune.select_best(measurements, 0.1)["max_batch_size"] == 1
+
+
+def test_resolve_settings_uses_cache_then_env(tmp_path, monkeypatch):
+    model_path = str(tmp_path / "yolo11n.pt")
+    cache = str(tmp_path / "autotune.json")
+    monkeypatch.setenv("AUTOTUNE_CACHE", cache)
+    for env in autotune.SETTING_ENV.values():
+        monkeypatch.delenv(env, raising=False)
+    monkeypatch.delenv("AUTOTUNE", raising=False)
+
+    assert autotune.resolve_settings(model_path) == {name: None for name in autotune.SETTING_ENV}
+
+    key = autotune.hardware_key(model_path, "fp32")
+    autotune.save_cached(cache, key, {"settings": {
+        "intra_threads": 2, "interop_threads": 1, "workers": 1, "max_batch_size": 4}})
+    assert autotune.resolve_settings(model_path)["max_batch_size"] == 4
+
+    monkeypatch.setenv("MAX_BATCH_SIZE", "2")
+    settings = autotune.resolve_settings(model_path)
+    assert settings["max_batch_size"] == 2
+    assert settings["intra_threads"] == 2
+    # another precision is another hardware class entry
+    assert autotune.resolve_settings(model_path, "int8")["intra_threads"] is None
+
+
+def test_resolve_settings_caps_batch_for_static_int8_export(tmp_path, monkeypatch):
+    model_path = str(tmp_path / "yolo11n.pt")
+    monkeypatch.setenv("AUTOTUNE_CACHE", str(tmp_path / "autotune.json"))
+    monkeypatch.delenv("AUTOTUNE", raising=False)
+    monkeypatch.setenv("MAX_BATCH_SIZE", "8")
+
+    assert autotune.resolve_settings(model_path, "fp32")["max_batch_size"] == 8
+    assert autotune.resolve_settings(model_path, "int8")["max_batch_size"] == 1
+
+
+class _InlinePool:
+    """Runs submitted calls in-process instead of a spawned worker."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_autotune_skips_thread_grid_for_int8(monkeypatch):
+    runs = []
+
+    def fake_benchmark(model_path, precision, interop, combos, image_size, batches):
+        runs.append((interop, combos))
+        return [dict(c, interop_threads=interop, throughput=c["workers"] * c["max_batch_size"], p95_latency=0.1)
+                for c in combos]
+
+    monkeypatch.setattr(autotune, "ProcessPoolExecutor", _InlinePool)
+    monkeypatch.setattr(autotune, "_benchmark_interop", fake_benchmark)
+    grid = {"intra_threads": [1, 2], "interop_threads": [1, 2], "workers": [1, 2], "max_batch_size": [1, 4]}
+
+    entry = autotune.autotune("yolo11n.pt", "int8", grid=grid)
+    assert [interop for interop, _ in runs] == [None]
+    assert {c["intra_threads"] for c in runs[0][1]} == {None}
+    assert {c["max_batch_size"] for c in runs[0][1]} == {1}
+    assert entry["settings"] == {"intra_threads": None, "interop_threads": None, "workers": 2, "max_batch_size": 1}
+
+    runs.clear()
+    assert autotune.autotune("yolo11n.pt", "fp32", grid=grid)["settings"]["interop_threads"] in (1, 2)
+    assert [interop for interop, _ in runs] == [1, 2]
+
+
+def test_resolve_settings_ignores_torch_threads_for_int8(tmp_path, monkeypatch):
+    model_path = str(tmp_path / "yolo11n.pt")
+    monkeypatch.setenv("AUTOTUNE_CACHE", str(tmp_path / "autotune.json"))
+    monkeypatch.delenv("AUTOTUNE", raising=False)
+    monkeypatch.setenv("TORCH_INTRA_THREADS", "4")
+
+    assert autotune.resolve_settings(model_path, "fp32")["intra_threads"] == 4
+    assert autotune.resolve_settings(model_path, "int8")["intra_threads"] is None
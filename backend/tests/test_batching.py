@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from batching import InferenceBatcher
+
+
+class EchoModel:
+    def __init__(self):
+        self.batch_sizes = []
+        self.release = threading.Event()
+
+    def __call__(self, sources):
+        self.release.wait(5)
+        self.batch_sizes.append(len(sources))
+        return [f"result-{s}" for s in sources]
+
+
+class Handler:
+    def __init__(self, model):
+        self.model = model
+        self.model_path = "unused.pt"
+        self.precision = "fp32"
+
+    def load(self):
+        return self.model
+
+
+def test_batches_queued_requests_and_preserves_order():
+    model = EchoModel()
+    batcher = InferenceBatcher(Handler(model), workers=1, max_batch_size=4, max_wait_ms=50)
+
+    first = batcher.submit(0)
+    # the worker is blocked on the first batch while the rest queue up
+    futures = [batcher.submit(i) for i in range(1, 5)]
+    model.release.set()
+
+    assert first.result(5).result == "result-0"
+    outcomes = [f.result(5) for f in futures]
+    assert [o.result for o in outcomes] == [f"result-{i}" for i in range(1, 5)]
+    assert max(model.batch_sizes) > 1
+    assert all(o.queue_seconds >= 0 and o.inference_seconds >= 0 for o in outcomes)
+
+
+def test_model_errors_fail_every_item_in_the_batch():
+    class Broken:
+        def __call__(self, sources):
+            raise RuntimeError("boom")
+
+    batcher = InferenceBatcher(Handler(Broken()), max_batch_size=2)
+    with pytest.raises(RuntimeError, match="boom"):
+        batcher.submit("x").result(5)
+
+
+def test_configure_after_start_is_rejected():
+    model = EchoModel()
+    model.release.set()
+    batcher = InferenceBatcher(Handler(model))
+    batcher.configure(workers=1, max_batch_size=8)
+    assert batcher.max_batch_size == 8
+    batcher.submit("x").result(5)
+    with pytest.raises(RuntimeError):
+        batcher.configure(max_batch_size=2)
+
+
+def test_cancelled_request_does_not_kill_the_worker():
+    model = EchoModel()
+    batcher = InferenceBatcher(Handler(model), workers=1, max_batch_size=1)
+
+    async def scenario():
+        blocker = asyncio.ensure_future(batcher.infer("a"))
+        await asyncio.sleep(0.05)  # the worker is now stuck on "a"
+        queued = asyncio.ensure_future(batcher.infer("b"))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        await asyncio.sleep(0.05)  # let the cancellation reach the queued future
+        model.release.set()
+        assert (await blocker).result == "result-a"
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        return await asyncio.wait_for(batcher.infer("c"), 5)
+
+    assert asyncio.run(scenario()).result == "result-c"
+    assert all(t.is_alive() for t in batcher._threads)
+    assert model.batch_sizes == [1, 1]
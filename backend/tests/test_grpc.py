@@ -0,0 +1,137 @@
+import io
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+grpc = pytest.importorskip("grpc")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from batching import InferenceBatcher
+from grpc_client import InferenceClient
+from grpc_service import InferenceServicer, decode_request, encode_request, start_server
+
+
+class ShapeModel:
+    """Returns each source's shape so the predictions reveal what the server decoded."""
+
+    def __call__(self, sources):
+        return [s.shape for s in sources]
+
+
+class Handler:
+    model_path = "unused.pt"
+    precision = "fp32"
+
+    def load(self):
+        return ShapeModel()
+
+
+def _to_predictions(results):
+    height, width, _ = results[0]
+    return {"predictions": [{"xyxy": [0.0, 0.0, float(width), float(height)], "score": 0.5, "class": 3}]}
+
+
+def _jpeg(width, height):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 30, 200)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def server():
+    priorities = []
+
+    def priority_for(metadata):
+        priorities.append(metadata.get("x-priority", "bulk"))
+        return priorities[-1]
+
+    batcher = InferenceBatcher(Handler(), max_batch_size=4, max_wait_ms=2)
+    server, port = start_server(InferenceServicer(batcher, _to_predictions, priority_for), 0, max_workers=4)
+    with InferenceClient(f"localhost:{port}", priority="interactive") as client:
+        yield client, priorities
+    server.stop(None)
+
+
+def test_request_framing_roundtrip():
+    pixels = np.random.default_rng(0).integers(0, 255, (5, 7, 3), dtype=np.uint8)
+    assert np.array_equal(decode_request(encode_request(pixels)), pixels)
+    assert decode_request(encode_request(_jpeg(7, 5))).shape == (5, 7, 3)
+    with pytest.raises(ValueError):
+        decode_request(encode_request(pixels)[:-1])
+
+
+def test_predict_encoded_and_tensor(server):
+    client, priorities = server
+    boxes = client.predict(_jpeg(64, 48))
+    assert boxes.dtype == np.float32
+    assert boxes.tolist() == [[0.0, 0.0, 64.0, 48.0, 0.5, 3.0]]
+
+    boxes, server_timing = client.predict_with_timing(np.zeros((20, 30, 3), dtype=np.uint8))
+    assert boxes[0, 2:4].tolist() == [30.0, 20.0]
+    assert "inference;dur=" in server_timing and "total;dur=" in server_timing
+    assert priorities == ["interactive", "interactive"]
+
+
+def test_stream_preserves_order(server):
+    client, _ = server
+    sizes = [(16 + i, 8 + i) for i in range(10)]
+    results = list(client.predict_stream(_jpeg(w, h) for w, h in sizes))
+    assert [tuple(r[0, 2:4].astype(int)) for r in results] == sizes
+
+
+def test_invalid_image_is_rejected(server):
+    client, _ = server
+    with pytest.raises(grpc.RpcError) as exc:
+        client.predict(b"not an image")
+    assert exc.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+    with pytest.raises(grpc.RpcError) as exc:
+        list(client.predict_stream([_jpeg(8, 8), b"broken"]))
+    assert exc.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+
+class SlowShapeModel(ShapeModel):
+    def __call__(self, sources):
+        time.sleep(0.01)
+        return super().__call__(sources)
+
+
+class CountingServicer(InferenceServicer):
+    """Tracks how many stream images were submitted but not yet answered."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.peak = 0
+
+    def _submit(self, message, request_id, priority):
+        with self.lock:
+            self.outstanding += 1
+            self.peak = max(self.peak, self.outstanding)
+        return super()._submit(message, request_id, priority)
+
+    def _pack(self, outcome):
+        with self.lock:
+            self.outstanding -= 1
+        return super()._pack(outcome)
+
+
+def test_stream_caps_images_in_flight():
+    handler = Handler()
+    handler.load = SlowShapeModel
+    batcher = InferenceBatcher(handler, max_batch_size=1, max_wait_ms=0)
+    servicer = CountingServicer(batcher, _to_predictions, lambda metadata: "bulk", max_in_flight=2)
+    server, port = start_server(servicer, 0, max_workers=2)
+    try:
+        with InferenceClient(f"localhost:{port}") as client:
+            results = list(client.predict_stream(_jpeg(16, 8) for _ in range(20)))
+    finally:
+        server.stop(None)
+    assert len(results) == 20
+    assert servicer.peak <= 2
@@ -0,0 +1,197 @@
+import functools
+import io
+import json
+import os
+import sys
+import time
+from fastapi.testclient import TestClient
+
+import httpx
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import api
+from api import app, job_store, model_handler
+from jobs import JobStore, job_owner
+from test_api import FakeResult
+
+
+class FakeBatchModel:
+    def __call__(self, sources):
+        return [FakeResult() for _ in sources]
+
+
+def _jpeg():
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 24), (120, 30, 200)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    model_handler.model = FakeBatchModel()
+    job_store.close()
+    monkeypatch.setattr(job_store, "path", str(tmp_path / "jobs.db"))
+    with TestClient(app) as c:
+        yield c
+    model_handler.model = None
+
+
+def _wait_for(client, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] == "completed":
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not complete: {job}")
+
+
+def test_job_roundtrip(client):
+    files = [("files", (f"img{i}.jpg", _jpeg(), "image/jpeg")) for i in range(3)]
+    files.append(("files", ("broken.jpg", b"not an image", "image/jpeg")))
+    r = client.post("/jobs", files=files)
+    assert r.status_code == 202
+    assert r.json()["total"] == 4
+
+    job = _wait_for(client, r.json()["id"])
+    assert (job["done"], job["failed"]) == (3, 1)
+    by_index = {item["index"]: item for item in job["results"]}
+    assert by_index[0]["predictions"] == [{"xyxy": [10.0, 20.0, 30.0, 40.0], "score": 0.9, "class": 1}]
+    assert by_index[3]["status"] == "failed"
+
+    summary = client.get(f"/jobs/{job['id']}?results=false").json()
+    assert "results" not in summary
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/jobs/does-not-exist").status_code == 404
+
+
+def test_store_requeues_running_items_and_purges_expired(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = JobStore(path)
+    job_id = store.create([("a.jpg", b"a"), ("b.jpg", b"b")])
+    assert len(store.claim(10, timeout=0)) == 2
+    store.close()
+
+    # a restarted process picks the claimed-but-unfinished items up again
+    store = JobStore(path)
+    claimed = store.claim(10, timeout=0)
+    assert sorted(idx for _, idx, _ in claimed) == [0, 1]
+    for _, idx, _ in claimed:
+        store.finish(job_id, idx, predictions=[])
+    assert store.get(job_id)["status"] == "completed"
+
+    assert store.purge(ttl_seconds=3600) == 0
+    assert store.purge(ttl_seconds=-1) == 1
+    assert store.get(job_id) is None
+
+
+def test_store_streams_files_and_prefixes_owner(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), owner="backend-1")
+    job_id = store.create((f"{i}.jpg", b"x") for i in range(3))
+    assert job_owner(job_id) == "backend-1"
+    assert store.get(job_id)["total"] == 3
+    assert job_owner("a" * 32) is None
+    assert job_owner("evil.com#." + "a" * 32) is None
+
+    with pytest.raises(ValueError):
+        JobStore(str(tmp_path / "other.db"), owner="Not A Label")
+
+
+def test_lookup_is_forwarded_to_owning_replica(client, monkeypatch):
+    # this replica is backend-0; jobs it creates are labelled as backend-1's, and
+    # "backend-1" is reached through the same app so the forwarded lookup finds them
+    monkeypatch.setattr(job_store, "owner", "backend-1")
+    monkeypatch.setattr(api, "JOB_OWNER", "backend-0")
+    monkeypatch.setattr(api, "JOB_PEER_URL", "http://{owner}.peers:8000")
+    monkeypatch.setattr(api.httpx, "AsyncClient",
+                        functools.partial(httpx.AsyncClient, transport=httpx.ASGITransport(app=app)))
+
+    r = client.post("/jobs", files=[("files", ("img.jpg", _jpeg(), "image/jpeg"))])
+    job_id = r.json()["id"]
+    assert job_owner(job_id) == "backend-1"
+    assert _wait_for(client, job_id)["done"] == 1
+
+    missing = "backend-1." + "0" * 32
+    assert client.get(f"/jobs/{missing}").status_code == 404
+
+    monkeypatch.setattr(api.httpx, "AsyncClient",
+                        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(
+                            lambda request: httpx.Response(502, text="bad gateway"))))
+    assert client.get(f"/jobs/{job_id}").status_code == 503
+
+
+def test_store_export_and_adopt_move_jobs_between_replicas(tmp_path):
+    source = JobStore(str(tmp_path / "source.db"), owner="backend-1")
+    finished = source.create([("a.jpg", b"a")])
+    queued = source.create([("b.jpg", b"b"), ("c.jpg", b"c")])
+    for job_id, idx, _ in source.claim(2, timeout=0):
+        if job_id == finished:
+            source.finish(job_id, idx, predictions=[{"xyxy": [1.0, 2.0, 3.0, 4.0], "score": 0.5, "class": 0}])
+
+    target = JobStore(str(tmp_path / "target.db"), owner="backend-0")
+    for job in source.export():
+        target.adopt(json.loads(json.dumps(job)))
+        source.delete(job["id"])
+
+    assert list(source.export()) == []
+    assert target.get(finished)["results"][0]["predictions"][0]["score"] == 0.5
+    # the item claimed on the source but never finished runs again on the target
+    assert sorted((idx, data) for _, idx, data in target.claim(10, timeout=0)) == [(0, b"b"), (1, b"c")]
+    assert target.get(queued)["status"] == "running"
+
+
+def test_shutdown_hands_jobs_to_another_replica(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "JOB_OWNER", "backend-1")
+    monkeypatch.setattr(api, "JOB_HANDOFF_OWNER", "backend-0")
+    monkeypatch.setattr(api, "JOB_PEER_URL", "http://{owner}.peers:8000")
+    monkeypatch.setattr(api, "JOB_PEER_TOKEN", "s3cret")
+    job_store.close()
+    monkeypatch.setattr(job_store, "path", str(tmp_path / "jobs.db"))
+    job_id = job_store.create([("img.jpg", _jpeg())])
+
+    received = []
+
+    def peer(request):
+        assert request.url.host == "backend-0.peers"
+        assert request.headers[api.JOB_PEER_TOKEN_HEADER] == "s3cret"
+        received.append(json.loads(request.content))
+        return httpx.Response(200, json={})
+
+    monkeypatch.setattr(api.httpx, "Client", functools.partial(httpx.Client, transport=httpx.MockTransport(peer)))
+    api._hand_off_jobs()
+    assert [job["id"] for job in received] == [job_id]
+    assert job_store.get(job_id) is None
+
+    # a peer that refuses leaves the job where it is
+    job_id = job_store.create([("img.jpg", _jpeg())])
+    monkeypatch.setattr(api.httpx, "Client", functools.partial(httpx.Client, transport=httpx.MockTransport(
+        lambda request: httpx.Response(403))))
+    api._hand_off_jobs()
+    assert job_store.get(job_id) is not None
+    job_store.close()
+
+
+def test_lookup_falls_back_to_replica_that_adopted_the_job(client, monkeypatch):
+    # this replica is backend-0 and adopts jobs from backend-1, which is gone
+    monkeypatch.setattr(api, "JOB_OWNER", "backend-0")
+    monkeypatch.setattr(api, "JOB_HANDOFF_OWNER", "backend-0")
+    monkeypatch.setattr(api, "JOB_PEER_URL", "http://{owner}.peers:8000")
+    monkeypatch.setattr(api, "JOB_PEER_TOKEN", "s3cret")
+    monkeypatch.setattr(api.httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(
+        lambda request: httpx.Response(502, text="bad gateway"))))
+
+    gone = JobStore(os.path.join(os.path.dirname(job_store.path), "gone.db"), owner="backend-1")
+    job_id = gone.create([("img.jpg", _jpeg())])
+    job = next(gone.export())
+    assert client.get(f"/jobs/{job_id}").status_code == 503
+
+    assert client.put(f"/jobs/{job_id}", json=job, headers={api.JOB_PEER_TOKEN_HEADER: "wrong"}).status_code == 403
+    assert client.put(f"/jobs/{job_id}", json={**job, "id": "other"},
+                      headers={api.JOB_PEER_TOKEN_HEADER: "s3cret"}).status_code == 400
+    assert client.put(f"/jobs/{job_id}", json=job, headers={api.JOB_PEER_TOKEN_HEADER: "s3cret"}).status_code == 200
+    # the adopted image is run by this replica's workers
+    assert _wait_for(client, job_id)["done"] == 1
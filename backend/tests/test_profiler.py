@@ -0,0 +1,73 @@
+import os
+import sys
+import threading
+import time
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api import app
+from profiler import SamplingProfiler, to_collapsed, to_speedscope
+
+
+def _busy(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sum(range(1000))
+
+
+def _run_session(profiler, **kwargs):
+    out = {}
+    t = threading.Thread(target=lambda: out.update(counts=profiler.profile(**kwargs)))
+    t.start()
+    while not profiler.active:
+        time.sleep(0.001)
+    return t, out
+
+
+def test_profile_requires_admin_token(monkeypatch):
+    client = TestClient(app)
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.get("/admin/profile?seconds=0.1").status_code == 403
+
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    r = client.get("/admin/profile?seconds=0.1", headers={"X-Admin-Token": "wrong"})
+    assert r.status_code == 403
+
+
+def test_profile_collapsed_and_speedscope(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    client = TestClient(app)
+
+    r = client.get("/admin/profile?seconds=0.2&interval_ms=5", headers={"X-Admin-Token": "s3cret"})
+    assert r.status_code == 200
+    line = r.text.splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert ";" in stack and int(count) > 0
+
+    r = client.get("/admin/profile?seconds=0.2&interval_ms=5&format=speedscope",
+                   headers={"X-Admin-Token": "s3cret"})
+    assert r.status_code == 200
+    doc = r.json()
+    assert doc["shared"]["frames"]
+    assert all(p["type"] == "sampled" for p in doc["profiles"])
+
+
+def test_slow_request_mode_keeps_only_slow_requests():
+    profiler = SamplingProfiler()
+    t, out = _run_session(profiler, seconds=0.5, interval=0.002, min_duration=0.1)
+
+    with profiler.attach("fast"):
+        _busy(0.1)
+    profiler.complete("fast", 0.01)
+    assert not profiler._counts
+
+    with profiler.attach("slow"):
+        _busy(0.1)
+    profiler.complete("slow", 0.2)
+    t.join()
+
+    counts = out["counts"]
+    assert counts
+    assert any(f[0] == "_busy" for (_, stack) in counts for f in stack)
+    assert "_busy" in to_collapsed(counts)
+    assert to_speedscope(counts)["profiles"]
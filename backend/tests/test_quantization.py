@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from quantization import match_detections, prepare_variant, summarize_parity, variant_path
+
+
+def _pred(xyxy, score, cls):
+    return {"xyxy": xyxy, "score": score, "class": cls}
+
+
+def test_match_detections_by_class_and_iou():
+    reference = [_pred([0, 0, 10, 10], 0.9, 0), _pred([20, 20, 40, 40], 0.8, 1)]
+    candidate = [
+        _pred([1, 1, 10, 10], 0.85, 0),    # matches first, IoU 0.81
+        _pred([20, 20, 40, 40], 0.7, 2),   # right box, wrong class
+        _pred([100, 100, 110, 110], 0.5, 1),
+    ]
+    m = match_detections(reference, candidate)
+    assert m["matched"] == 1
+    summary = summarize_parity([m])
+    assert summary["recall"] == pytest.approx(0.5)
+    assert summary["precision"] == pytest.approx(1 / 3)
+    assert summary["mean_iou"] == pytest.approx(0.81)
+    assert summary["mean_score_delta"] == pytest.approx(-0.05)
+
+
+def test_variant_path_and_cached_export(tmp_path):
+    weights = tmp_path / "yolo11n.pt"
+    assert variant_path(str(weights), "fp32") == str(weights)
+    cached = tmp_path / "yolo11n_int8_openvino_model"
+    assert variant_path(str(weights), "int8") == str(cached)
+
+    # an existing export is reused without touching ultralytics
+    cached.mkdir()
+    assert prepare_variant(str(weights), "int8") == str(cached)
+
+    with pytest.raises(RuntimeError):
+        prepare_variant(str(weights), "fp8")
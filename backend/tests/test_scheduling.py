@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fastapi.testclient import TestClient
+
+from api import app, scheduler
+from scheduling import BULK, INTERACTIVE, WeightedFairQueue, parse_api_keys
+
+
+def test_interactive_jumps_queued_bulk():
+    q = WeightedFairQueue(min_shares={BULK: 0.0})
+    for i in range(3):
+        q.put(f"b{i}", BULK)
+    q.put("i0", INTERACTIVE)
+
+    assert q.get_batch(4, 0) == (INTERACTIVE, ["i0"])
+    assert q.get_batch(4, 0) == (BULK, ["b0", "b1", "b2"])
+
+
+def test_bulk_gets_minimum_share_under_interactive_load():
+    q = WeightedFairQueue(min_shares={BULK: 0.25}, window=20)
+    for i in range(50):
+        q.put(f"b{i}", BULK)
+    served = []
+    for i in range(40):
+        q.put(f"i{i}", INTERACTIVE)
+        served.append(q.get_batch(1, 0)[0])
+
+    share = served.count(BULK) / len(served)
+    assert 0.2 <= share <= 0.3
+    stats = q.stats()
+    assert stats[BULK]["queue_depth"] == 50 - served.count(BULK)
+    assert stats[INTERACTIVE]["served"] == served.count(INTERACTIVE)
+
+
+def test_bulk_burst_after_interactive_only_traffic_waits_its_turn():
+    q = WeightedFairQueue(min_shares={BULK: 0.1})
+    for i in range(200):
+        q.put(f"i{i}", INTERACTIVE)
+        assert q.get_batch(1, 0) == (INTERACTIVE, [f"i{i}"])
+
+    # bulk was not waiting during those 200, so it has no share to catch up on
+    for i in range(50):
+        q.put(f"b{i}", BULK)
+    q.put("late", INTERACTIVE)
+    assert q.get_batch(1, 0) == (INTERACTIVE, ["late"])
+
+    # once backlogged, bulk gets its share: one item per ten dispatched
+    served = []
+    for i in range(30):
+        q.put(f"j{i}", INTERACTIVE)
+        served.append(q.get_batch(1, 0)[0])
+    assert served.count(BULK) == 3
+    assert served[:9] == [INTERACTIVE] * 9
+
+
+def test_parse_api_keys_ignores_unknown_classes():
+    assert parse_api_keys("abc:bulk, ui-key:interactive,bad:urgent,") == {
+        "abc": BULK, "ui-key": INTERACTIVE}
+
+
+def test_predict_priority_header_is_reported(tmp_path):
+    from test_api import FakeModel, _write_jpeg
+    from api import model_handler
+
+    model_handler.model = FakeModel()
+    try:
+        client = TestClient(app)
+        before = scheduler.stats()[INTERACTIVE]["served"]
+        img = tmp_path / "img.jpg"
+        _write_jpeg(img)
+        with open(img, "rb") as f:
+            r = client.post("/predict", files={"file": ("img.jpg", f, "image/jpeg")},
+                            headers={"X-Priority": "interactive"})
+        assert r.status_code == 200
+
+        stats = client.get("/scheduler/stats").json()
+        assert set(stats) == {INTERACTIVE, BULK}
+        assert stats[INTERACTIVE]["served"] == before + 1
+    finally:
+        model_handler.model = None
+
+
+def test_invalid_default_priority_fails_at_import():
+    backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    proc = subprocess.run([sys.executable, "-c", "import api"], cwd=backend_dir, capture_output=True,
+                          text=True, env={**os.environ, "DEFAULT_PRIORITY": "bulkk"})
+    assert proc.returncode != 0
+    assert "DEFAULT_PRIORITY" in proc.stderr
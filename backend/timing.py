@@ -0,0 +1,68 @@
+"""Per-request stage timing used for Server-Timing headers and access logs."""
+
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._\-]{1,128}$")
+
+
+def resolve_request_id(incoming: Optional[str]) -> str:
+    """Reuse a caller-supplied request ID when it is safe to echo, else mint one."""
+    if incoming and _REQUEST_ID_RE.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+class StageTimer:
+    """Accumulates named stage durations for a single request.
+
+    `lap(name)` attributes the time since the previous checkpoint to `name`,
+    which is how time spent outside our code (e.g. multipart parsing before
+    the endpoint body runs) is captured. `stage(name)` times a block.
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self._checkpoint = self.start
+        self.stages: Dict[str, float] = {}
+
+    def _add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record(self, name: str, seconds: float):
+        """Add a duration measured elsewhere (e.g. on an inference worker)."""
+        self._add(name, seconds)
+
+    def lap(self, name: str):
+        now = time.perf_counter()
+        self._add(name, now - self._checkpoint)
+        self._checkpoint = now
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._add(name, now - started)
+            self._checkpoint = now
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def stages_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+    def server_timing(self, total: float) -> str:
+        """Render the stages as a Server-Timing header value (durations in ms)."""
+        entries = [f"{name};dur={ms}" for name, ms in self.stages_ms().items()]
+        entries.append(f"total;dur={round(total * 1000, 3)}")
+        return ", ".join(entries)
+
@@ -19,13 +19,16 @@ kubectl apply -f k8s/shared/namespace.yaml
 
 # Deploy backend
 echo "🚀 Deploying backend..."
-kubectl apply -f k8s/backend/deployment.yaml
+# Shared token the backend replicas use to hand jobs to each other; created once
+kubectl get secret backend-job-peer -n yolo-app >/dev/null 2>&1 || \
+  kubectl create secret generic backend-job-peer -n yolo-app --from-literal=token="$(openssl rand -hex 32)"
+kubectl apply -f k8s/backend/statefulset.yaml
 kubectl apply -f k8s/backend/service.yaml
 kubectl apply -f k8s/backend/ingress.yaml 2>/dev/null || echo "⚠️  Ingress not available, skipping"
 
 # Wait for deployment to be ready
 echo "⏳ Waiting for backend to be ready..."
-kubectl wait --for=condition=available --timeout=300s deployment/backend -n yolo-app
+kubectl rollout status statefulset/backend --timeout=300s -n yolo-app
 
 echo ""
 echo "✅ Backend deployment completed!"
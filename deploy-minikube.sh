@@ -38,7 +38,10 @@ kubectl apply -f k8s/shared/namespace.yaml
 
 # Deploy backend (without ingress first)
 echo "🔧 Deploying backend..."
-kubectl apply -f k8s/backend/deployment.yaml
+# Shared token the backend replicas use to hand jobs to each other; created once
+kubectl get secret backend-job-peer -n yolo-app >/dev/null 2>&1 || \
+  kubectl create secret generic backend-job-peer -n yolo-app --from-literal=token="$(openssl rand -hex 32)"
+kubectl apply -f k8s/backend/statefulset.yaml
 kubectl apply -f k8s/backend/service.yaml
 
 # Deploy frontend (without ingress first)
@@ -48,7 +51,7 @@ kubectl apply -f k8s/frontend/service.yaml
 
 # Wait for deployments to be ready
 echo "⏳ Waiting for deployments to be ready..."
-kubectl wait --for=condition=available --timeout=300s deployment/backend -n yolo-app
+kubectl rollout status statefulset/backend --timeout=300s -n yolo-app
 kubectl wait --for=condition=available --timeout=300s deployment/frontend -n yolo-app
 
 # Deploy HPA (Horizontal Pod Autoscaler)
@@ -1,50 +1,126 @@
 import io
 import os
+import time
+import uuid
 import requests
-from PIL import Image
+from PIL import Image, ImageDraw
 import gradio as gr
 
 
 BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:8000/predict")
-
-
-def run_inference(image, return_image=False):
+REQUEST_ID_HEADER = "X-Request-ID"
+# the model runs at ~640px, so larger uploads only cost bandwidth and decode time
+UPLOAD_MAX_SIDE = int(os.environ.get("UPLOAD_MAX_SIDE", 640))
+# PIL's default, which full-resolution uploads used before; higher makes
+# images that need no downscaling larger than they were
+DEFAULT_JPEG_QUALITY = 75
+UPLOAD_JPEG_QUALITY = int(os.environ.get("UPLOAD_JPEG_QUALITY", DEFAULT_JPEG_QUALITY))
+
+
+def _encode_jpeg(image, quality=None):
+    buf = io.BytesIO()
+    if quality is None:
+        image.save(buf, format='JPEG')
+    else:
+        image.save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
+
+
+def prepare_upload(image, max_side=UPLOAD_MAX_SIDE, quality=UPLOAD_JPEG_QUALITY):
+    """Downscale so the longest side is at most `max_side` (0 disables) and JPEG-encode.
+
+    Returns the encoded bytes and the factor that maps uploaded coordinates
+    back to the original image.
+    """
+    width, height = image.size
+    scale = 1.0
+    if max_side and max(width, height) > max_side:
+        scale = max(width, height) / max_side
+        image = image.resize((round(width / scale), round(height / scale)), Image.BILINEAR)
+        scale = width / image.size[0]
+    return _encode_jpeg(image, quality), scale
+
+
+def scale_predictions(predictions, scale):
+    """Map boxes from uploaded-image coordinates back to the original image."""
+    if scale == 1.0:
+        return predictions
+    return [dict(p, xyxy=[v * scale for v in p['xyxy']]) for p in predictions]
+
+
+def _server_total_ms(server_timing):
+    for entry in server_timing.split(','):
+        name, _, params = entry.strip().partition(';')
+        if name == 'total' and params.startswith('dur='):
+            try:
+                return float(params[4:])
+            except ValueError:
+                return None
+    return None
+
+
+def draw_predictions(image, predictions):
+    annotated = image.copy()
+    draw = ImageDraw.Draw(annotated)
+    line = max(2, round(max(image.size) / 400))
+    for p in predictions:
+        x1, y1, x2, y2 = p['xyxy']
+        draw.rectangle([x1, y1, x2, y2], outline=(255, 56, 56), width=line)
+        draw.text((x1 + line, y1 + line), f"{p.get('name', p['class'])} {p['score']:.2f}", fill=(255, 56, 56))
+    return annotated
+
+
+def run_inference(image, return_image=False, request_id=None,
+                  max_side=UPLOAD_MAX_SIDE, quality=UPLOAD_JPEG_QUALITY):
     if image is None:
-        return "No image provided", None
+        return "No image provided", None, ""
 
-    # Gradio gives us a PIL Image or numpy array; convert to bytes
-    img_byte_arr = io.BytesIO()
-    if isinstance(image, Image.Image):
-        image.save(img_byte_arr, format='JPEG')
-    else:
-        Image.fromarray(image).save(img_byte_arr, format='JPEG')
+    # forward the caller's trace ID (e.g. set by an ingress) or start a new one
+    request_id = request_id or uuid.uuid4().hex
 
-    img_byte_arr.seek(0)
+    # Gradio gives us a PIL Image or numpy array
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    image = image.convert('RGB')
 
-    params = {}
-    if return_image:
-        params['return_image'] = 'true'
+    payload, scale = prepare_upload(image, int(max_side), int(quality))
 
-    files = {'file': ('image.jpg', img_byte_arr, 'image/jpeg')}
+    files = {'file': ('image.jpg', payload, 'image/jpeg')}
 
+    started = time.perf_counter()
     try:
-        resp = requests.post(BACKEND_URL, params=params, files=files, timeout=30)
+        resp = requests.post(BACKEND_URL, files=files,
+                             headers={REQUEST_ID_HEADER: request_id, 'X-Priority': 'interactive'},
+                             timeout=30)
         resp.raise_for_status()
     except Exception as e:
-        return f"Request failed: {e}", None
+        return f"Request {request_id} failed: {e}", None, ""
+    round_trip = time.perf_counter() - started
+
+    server_timing = resp.headers.get('Server-Timing', '')
 
     j = resp.json()
+    j['predictions'] = scale_predictions(j.get('predictions', []), scale)
 
-    annotated = None
-    if j.get('image'):
-        image_data = io.BytesIO()
-        image_data.write(bytes(j['image'], 'utf-8'))
-        # it's base64 string; decode
-        import base64
-        annotated = Image.open(io.BytesIO(base64.b64decode(j['image'])))
+    # boxes are drawn locally on the original image, so no annotated image is downloaded
+    annotated = draw_predictions(image, j['predictions']) if return_image else None
 
-    pretty = j
-    return pretty, annotated
+    uploaded_size = (round(image.size[0] / scale), round(image.size[1] / scale))
+    stats = f"Uploaded **{len(payload) / 1024:.1f} KB** ({uploaded_size[0]}×{uploaded_size[1]}, q={int(quality)})"
+    # compared with the old upload: full resolution at the default quality,
+    # which is exactly the payload when neither setting changes it
+    if scale == 1.0 and int(quality) == DEFAULT_JPEG_QUALITY:
+        baseline_size = len(payload)
+    else:
+        baseline_size = len(_encode_jpeg(image))
+    change = len(payload) / baseline_size - 1
+    stats += (f" vs {baseline_size / 1024:.1f} KB at {image.size[0]}×{image.size[1]}, q={DEFAULT_JPEG_QUALITY}: "
+              f"**{abs(change):.0%} {'larger' if change > 0 else 'smaller'}**")
+    stats += f" · round trip **{round_trip * 1000:.0f} ms**"
+    server_total = _server_total_ms(server_timing)
+    if server_total is not None:
+        stats += f" (server {server_total:.0f} ms)"
+    return j, annotated, stats
 
 
 def launch(interface_port: int = 7860):
@@ -53,15 +129,20 @@ def launch(interface_port: int = 7860):
         with gr.Row():
             img_in = gr.Image(type='pil', label='Input Image')
             with gr.Column():
-                ret_img = gr.Checkbox(label='Return annotated image', value=True)
+                ret_img = gr.Checkbox(label='Show annotated image', value=True)
+                max_side = gr.Slider(0, 1920, value=UPLOAD_MAX_SIDE, step=32,
+                                     label='Max upload side (px, 0 = original)')
+                quality = gr.Slider(30, 100, value=UPLOAD_JPEG_QUALITY, step=1, label='JPEG quality')
                 btn = gr.Button('Run')
+        out_stats = gr.Markdown()
         out_text = gr.JSON(label='Predictions')
         out_img = gr.Image(label='Annotated image')
 
-        def _run(img, return_image):
-            return run_inference(img, return_image)
+        def _run(img, return_image, side, q, request: gr.Request):
+            incoming = request.headers.get(REQUEST_ID_HEADER) if request else None
+            return run_inference(img, return_image, request_id=incoming, max_side=side, quality=q)
 
-        btn.click(fn=_run, inputs=[img_in, ret_img], outputs=[out_text, out_img])
+        btn.click(fn=_run, inputs=[img_in, ret_img, max_side, quality], outputs=[out_text, out_img, out_stats])
 
     demo.launch(server_name='0.0.0.0', server_port=interface_port)
 
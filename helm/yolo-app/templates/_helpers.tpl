@@ -47,3 +47,11 @@ Selector labels
 app.kubernetes.io/name: {{ include "yolo-app.name" . }}
 app.kubernetes.io/instance: {{ .Release.Name }}
 {{- end }}
+
+{{/*
+Non-empty when something reads the backend cache volume: an INT8 export or
+autotune results. Without either, no cache volume is created or mounted.
+*/}}
+{{- define "yolo-app.backendCache" -}}
+{{- if or (ne .Values.config.yoloPrecision "fp32") .Values.config.autotune }}true{{- end }}
+{{- end }}
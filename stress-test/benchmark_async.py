@@ -16,9 +16,10 @@ import statistics
 import yaml
 import random
 import glob
+import uuid
 from PIL import Image
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -31,6 +32,8 @@ class BenchmarkResult:
     response_time: float
     success: bool
     error: str = None
+    request_id: str = None
+    server_timing: Optional[Dict[str, float]] = None  # stage -> seconds, from Server-Timing
 
 
 # Load available images from val2014 directory
@@ -43,6 +46,22 @@ else:
     IMAGE_POOL = []
 
 
+def parse_server_timing(value: Optional[str]) -> Dict[str, float]:
+    """Parse a Server-Timing header into {metric: seconds}."""
+    timings = {}
+    if not value:
+        return timings
+    for entry in value.split(','):
+        parts = [p.strip() for p in entry.split(';')]
+        for param in parts[1:]:
+            if param.startswith('dur='):
+                try:
+                    timings[parts[0]] = float(param[4:]) / 1000
+                except ValueError:
+                    pass
+    return timings
+
+
 def load_config():
     """Load configuration from config.yaml."""
     config_path = Path(__file__).parent / "config.yaml"
@@ -50,6 +69,25 @@ def load_config():
         return yaml.safe_load(f)
 
 
+def parse_duration(value) -> float:
+    """Convert a profile duration ("30s", "5m", "2h", "1h30m" or seconds) to seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    total = 0.0
+    number = ''
+    for char in str(value).strip():
+        if char.isdigit() or char == '.':
+            number += char
+        elif char in 'smh' and number:
+            total += float(number) * {'s': 1, 'm': 60, 'h': 3600}[char]
+            number = ''
+        else:
+            raise ValueError(f"invalid duration: {value!r}")
+    if number:
+        total += float(number)
+    return total
+
+
 def create_test_image(width=640, height=480) -> bytes:
     """Load a random image from val2014 or create a synthetic one."""
     if IMAGE_POOL:
@@ -111,6 +149,7 @@ async def test_predict(
     """Test the /predict endpoint."""
     start_time = time.time()
     endpoint = f"/predict?return_image={return_image}"
+    request_id = uuid.uuid4().hex
     
     try:
         img_data = create_test_image(width=image_size[0], height=image_size[1])
@@ -124,6 +163,7 @@ async def test_predict(
         async with session.post(
             f"{base_url}{endpoint}",
             data=data,
+            headers={"X-Request-ID": request_id},
             timeout=aiohttp.ClientTimeout(total=60)
         ) as response:
             await response.read()
@@ -132,7 +172,9 @@ async def test_predict(
                 endpoint=endpoint,
                 status_code=response.status,
                 response_time=response_time,
-                success=response.status == 200
+                success=response.status == 200,
+                request_id=request_id,
+                server_timing=parse_server_timing(response.headers.get("Server-Timing"))
             )
     except Exception as e:
         response_time = time.time() - start_time
@@ -141,7 +183,8 @@ async def test_predict(
             status_code=0,
             response_time=response_time,
             success=False,
-            error=str(e)
+            error=str(e),
+            request_id=request_id
         )
 
 
@@ -272,6 +315,28 @@ def print_summary(results: List[BenchmarkResult], total_time: float, config: dic
         print(f"  95th: {p95:.3f}s")
         print(f"  99th: {p99:.3f}s")
     
+    # Client-observed vs server-side time (needs the backend's Server-Timing header)
+    timed = [r for r in successful_requests if r.server_timing and 'total' in r.server_timing]
+    if timed:
+        stage_names = []
+        for r in timed:
+            for name in r.server_timing:
+                if name != 'total' and name not in stage_names:
+                    stage_names.append(name)
+        server_totals = [r.server_timing['total'] for r in timed]
+        compute = [r.server_timing.get('inference', 0.0) for r in timed]
+        outside = [max(r.response_time - r.server_timing['total'], 0.0) for r in timed]
+
+        print(f"\nServer-side breakdown ({len(timed)} requests with Server-Timing, mean):")
+        for name in stage_names:
+            print(f"  {name + ':':14} {statistics.mean(r.server_timing.get(name, 0.0) for r in timed):.3f}s")
+        print(f"  {'server total:':14} {statistics.mean(server_totals):.3f}s")
+        print(f"\nLatency split (mean):")
+        print(f"  Client observed:        {statistics.mean(r.response_time for r in timed):.3f}s")
+        print(f"  Network + queueing:     {statistics.mean(outside):.3f}s")
+        print(f"  Server (non-compute):   {statistics.mean(t - c for t, c in zip(server_totals, compute)):.3f}s")
+        print(f"  Compute (inference):    {statistics.mean(compute):.3f}s")
+    
     # Breakdown by endpoint
     endpoints = {}
     for result in results:
@@ -0,0 +1,210 @@
+"""
+Compare the HTTP /predict endpoint with the gRPC inference interface.
+
+Sends the same pre-encoded images through three transports at a fixed
+concurrency and reports throughput, per-request latency and bytes on the
+wire per request:
+
+    http         multipart POST /predict, JSON response (requests.Session per worker)
+    grpc         unary Predict over one shared HTTP/2 channel
+    grpc-stream  one bidirectional PredictStream per worker
+
+Needs grpcio (pip install grpcio) and a backend started with GRPC_PORT set.
+
+Usage:
+    python benchmark_grpc.py --env local
+    python benchmark_grpc.py --url http://localhost:8000 --grpc-target localhost:50051 -n 2000 -c 16
+    python benchmark_grpc.py --env local --size large --tensor   # send decoded pixels over gRPC
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import urlparse
+
+import requests
+
+from benchmark_async import create_test_image, load_config
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from grpc_client import InferenceClient  # noqa: E402
+from grpc_service import encode_request  # noqa: E402
+from imaging import decode_image  # noqa: E402
+
+TRANSPORTS = ("http", "grpc", "grpc-stream")
+
+
+def describe(latencies: List[float], failures: int, wall: float, request_bytes: float) -> Dict[str, float]:
+    ordered = sorted(latencies) or [0.0]
+    return {
+        'requests': len(latencies),
+        'failures': failures,
+        'throughput': len(latencies) / wall if wall else 0.0,
+        'mean': statistics.mean(ordered),
+        'p50': ordered[int(len(ordered) * 0.50)],
+        'p95': ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+        'p99': ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)],
+        'request_bytes': request_bytes,
+    }
+
+
+def _split(total: int, workers: int) -> List[int]:
+    return [total // workers + (1 if i < total % workers else 0) for i in range(workers)]
+
+
+def _run_workers(worker, counts: List[int]):
+    latencies: List[float] = []
+    failures = [0]
+    lock = threading.Lock()
+
+    def run(index, count):
+        local, failed = worker(index, count)
+        with lock:
+            latencies.extend(local)
+            failures[0] += failed
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(counts)) as pool:
+        list(pool.map(run, range(len(counts)), counts))
+    return latencies, failures[0], time.perf_counter() - start_time
+
+
+def bench_http(base_url: str, payloads: List[bytes], counts: List[int]):
+    url = f"{base_url.rstrip('/')}/predict"
+
+    def worker(index, count):
+        latencies, failed = [], 0
+        with requests.Session() as session:
+            for i in range(count):
+                payload = payloads[(index + i) % len(payloads)]
+                started = time.perf_counter()
+                try:
+                    r = session.post(url, files={"file": ("bench.jpg", payload, "image/jpeg")}, timeout=60)
+                    r.json()["predictions"]
+                    ok = r.status_code == 200
+                except Exception:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    failed += 1
+        return latencies, failed
+
+    return _run_workers(worker, counts)
+
+
+def bench_grpc(client: InferenceClient, messages: List, counts: List[int]):
+    def worker(index, count):
+        latencies, failed = [], 0
+        for i in range(count):
+            started = time.perf_counter()
+            try:
+                client.predict(messages[(index + i) % len(messages)])
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                failed += 1
+        return latencies, failed
+
+    return _run_workers(worker, counts)
+
+
+def bench_grpc_stream(client: InferenceClient, messages: List, counts: List[int]):
+    def worker(index, count):
+        sent_at: List[float] = []
+
+        def images():
+            for i in range(count):
+                sent_at.append(time.perf_counter())
+                yield messages[(index + i) % len(messages)]
+
+        latencies = []
+        try:
+            for i, _ in enumerate(client.predict_stream(images())):
+                latencies.append(time.perf_counter() - sent_at[i])
+        except Exception:
+            pass
+        return latencies, count - len(latencies)
+
+    return _run_workers(worker, counts)
+
+
+def main():
+    config = load_config()
+
+    parser = argparse.ArgumentParser(description='Compare HTTP /predict with the gRPC inference interface')
+    parser.add_argument('--env', type=str, choices=list(config['environments'].keys()),
+                       help='Environment to test (from config.yaml)')
+    parser.add_argument('--url', type=str,
+                       help='HTTP base URL (overrides --env)')
+    parser.add_argument('--grpc-target', type=str,
+                       help='gRPC host:port (default: environment `grpc` entry, else URL host:50051)')
+    parser.add_argument('--requests', '-n', type=int, default=500,
+                       help='Requests per transport')
+    parser.add_argument('--concurrent', '-c', type=int, default=8,
+                       help='Concurrent workers (and streams) per transport')
+    parser.add_argument('--size', type=str, default='small', choices=list(config.get('image_sizes', {}).keys()),
+                       help='Image size from config.yaml')
+    parser.add_argument('--tensor', action='store_true',
+                       help='Send pre-decoded BGR pixels over gRPC instead of JPEG bytes')
+    parser.add_argument('--payload-pool', type=int, default=16,
+                       help='Pre-encoded images reused across requests')
+    parser.add_argument('--transports', type=str, default=','.join(TRANSPORTS),
+                       help=f'Comma-separated subset of {", ".join(TRANSPORTS)}')
+    args = parser.parse_args()
+
+    env_config = config['environments'][args.env or 'local']
+    base_url = args.url or env_config['url']
+    grpc_target = args.grpc_target or env_config.get('grpc') or f"{urlparse(base_url).hostname}:50051"
+    transports = [t.strip() for t in args.transports.split(',') if t.strip()]
+    unknown = set(transports) - set(TRANSPORTS)
+    if unknown:
+        parser.error(f"unknown transports: {', '.join(sorted(unknown))}")
+
+    width, height = config['image_sizes'][args.size]
+    payloads = [create_test_image(width, height) for _ in range(args.payload_pool)]
+    messages = [decode_image(p) for p in payloads] if args.tensor else payloads
+    counts = _split(args.requests, args.concurrent)
+
+    print(f"\n{'='*70}")
+    print("YOLO Backend API - HTTP vs gRPC Benchmark")
+    print(f"{'='*70}")
+    print(f"HTTP: {base_url}")
+    print(f"gRPC: {grpc_target} ({'tensor' if args.tensor else 'encoded'} payloads)")
+    print(f"Requests: {args.requests} per transport, concurrency {args.concurrent}")
+    print(f"Images: {args.payload_pool} x {width}x{height}")
+    print(f"{'-'*70}")
+
+    http_bytes = statistics.mean(len(p) for p in payloads)
+    grpc_bytes = statistics.mean(len(encode_request(m)) for m in messages)
+    results = {}
+    with InferenceClient(grpc_target) as client:
+        for transport in transports:
+            print(f"Running {transport}...")
+            if transport == 'http':
+                latencies, failures, wall = bench_http(base_url, payloads, counts)
+                results[transport] = describe(latencies, failures, wall, http_bytes)
+            elif transport == 'grpc':
+                latencies, failures, wall = bench_grpc(client, messages, counts)
+                results[transport] = describe(latencies, failures, wall, grpc_bytes)
+            else:
+                latencies, failures, wall = bench_grpc_stream(client, messages, counts)
+                results[transport] = describe(latencies, failures, wall, grpc_bytes)
+
+    print(f"\n  {'transport':12} {'req/s':>8} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'KB/req':>8} {'fail':>6}")
+    for transport, r in results.items():
+        print(f"  {transport:12} {r['throughput']:8.1f} {r['mean'] * 1000:7.1f}ms {r['p50'] * 1000:7.1f}ms "
+              f"{r['p95'] * 1000:7.1f}ms {r['p99'] * 1000:7.1f}ms {r['request_bytes'] / 1024:8.1f} {r['failures']:6d}")
+    if 'http' in results and results['http']['throughput']:
+        for transport in ('grpc', 'grpc-stream'):
+            if transport in results:
+                print(f"  {transport} throughput vs http: {results[transport]['throughput'] / results['http']['throughput']:.2f}x")
+    print(f"{'='*70}\n")
+
+
+if __name__ == "__main__":
+    main()
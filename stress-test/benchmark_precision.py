@@ -0,0 +1,127 @@
+"""
+Precision benchmark for the YOLO backend model.
+
+Runs the FP32 model and a reduced-precision variant (see backend/quantization.py)
+in-process on the same sample images, and reports the latency speedup and the
+detection parity (recall/precision/IoU of the variant against FP32).
+
+Needs the backend dependencies (pip install -r ../backend/requirements.txt).
+
+Usage:
+    python benchmark_precision.py --model ../backend/model/yolo11n.pt
+    python benchmark_precision.py --model yolo11n.pt --precision int8 --samples 200 --threads 2
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from benchmark_async import IMAGE_POOL, create_test_image, load_config
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from api import ModelHandler, _preds_to_json  # noqa: E402
+from quantization import PRECISIONS, match_detections, summarize_parity  # noqa: E402
+
+
+def load_samples(count: int, width: int, height: int):
+    """Decode sample images once into BGR arrays, as Ultralytics expects."""
+    samples = []
+    for _ in range(count):
+        img = Image.open(io.BytesIO(create_test_image(width, height))).convert('RGB')
+        samples.append(np.ascontiguousarray(np.asarray(img)[:, :, ::-1]))
+    return samples
+
+
+def time_model(model, samples, warmup: int):
+    for sample in samples[:warmup]:
+        model(sample, verbose=False)
+    latencies = []
+    predictions = []
+    for sample in samples:
+        start_time = time.perf_counter()
+        results = model(sample, verbose=False)
+        latencies.append(time.perf_counter() - start_time)
+        predictions.append(_preds_to_json(results)["predictions"])
+    return latencies, predictions
+
+
+def describe(latencies):
+    ordered = sorted(latencies)
+    return {
+        'mean': statistics.mean(ordered),
+        'p50': ordered[int(len(ordered) * 0.50)],
+        'p95': ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+    }
+
+
+def main():
+    config = load_config()
+
+    parser = argparse.ArgumentParser(description='Compare FP32 and reduced-precision YOLO inference')
+    parser.add_argument('--model', type=str, default=os.environ.get('YOLO_MODEL', 'yolo11n.pt'),
+                       help='Path to the FP32 weights')
+    parser.add_argument('--precision', type=str, default='int8', choices=[p for p in PRECISIONS if p != 'fp32'],
+                       help='Variant to compare against FP32')
+    parser.add_argument('--samples', type=int, default=100,
+                       help='Number of sample images')
+    parser.add_argument('--warmup', type=int, default=5,
+                       help='Untimed warmup inferences per model')
+    parser.add_argument('--iou', type=float, default=0.5,
+                       help='IoU threshold for matching detections')
+    parser.add_argument('--threads', type=int,
+                       help='torch intra-op threads (default: torch default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    width, height = config.get('image_sizes', {}).get('small', [640, 480])
+    if not IMAGE_POOL:
+        print("Warning: val2014 not found; synthetic noise images have few detections, parity will be trivial")
+    samples = load_samples(args.samples, width, height)
+
+    print(f"\n{'='*70}")
+    print("YOLO Model - Precision Benchmark")
+    print(f"{'='*70}")
+    print(f"Model: {args.model}")
+    print(f"Variant: {args.precision}")
+    print(f"Samples: {len(samples)} ({width}x{height})")
+    print(f"{'-'*70}")
+
+    reference_model = ModelHandler(args.model, precision='fp32').load()
+    candidate_model = ModelHandler(args.model, precision=args.precision).load()
+
+    fp32_latencies, fp32_preds = time_model(reference_model, samples, args.warmup)
+    variant_latencies, variant_preds = time_model(candidate_model, samples, args.warmup)
+
+    fp32 = describe(fp32_latencies)
+    variant = describe(variant_latencies)
+    parity = summarize_parity([
+        match_detections(ref, cand, args.iou) for ref, cand in zip(fp32_preds, variant_preds)
+    ])
+
+    print(f"\nLatency per image:")
+    print(f"  {'':8} {'mean':>8} {'p50':>8} {'p95':>8}")
+    print(f"  {'fp32':8} {fp32['mean']:8.4f} {fp32['p50']:8.4f} {fp32['p95']:8.4f}")
+    print(f"  {args.precision:8} {variant['mean']:8.4f} {variant['p50']:8.4f} {variant['p95']:8.4f}")
+    print(f"  Speedup (mean): {fp32['mean'] / variant['mean']:.2f}x")
+
+    print(f"\nDetection parity vs fp32 (IoU >= {args.iou}, same class):")
+    print(f"  Detections: fp32 {parity['reference_detections']}, {args.precision} {parity['candidate_detections']}")
+    print(f"  Recall:     {parity['recall']:.2%}")
+    print(f"  Precision:  {parity['precision']:.2%}")
+    print(f"  Mean IoU:   {parity['mean_iou']:.3f}")
+    print(f"  Mean score delta: {parity['mean_score_delta']:+.4f}")
+    print(f"{'='*70}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+"""
+Capacity search for the YOLO backend API.
+
+Steps the offered load (open-loop, requests/second) up until the latency or
+failure-rate thresholds from config.yaml are violated, then binary-searches
+between the last passing and first failing rate. Reports the maximum
+sustainable RPS per replica and the latency/throughput knee curve.
+
+When a CPU source is given, the backend's CPU usage is sampled during every
+stage and the HPA target is derived from the utilization measured at the
+highest passing stage, next to the chart's current target.
+
+Usage:
+    python capacity_search.py --env local --docker aio2025-kubeflow-backend-1
+    python capacity_search.py --url http://localhost:8000 --pid $(pgrep -f "uvicorn api:app")
+    python capacity_search.py --env k8s --replicas 2 --kube-selector app=backend --output results/capacity_k8s.json
+"""
+
+import asyncio
+import abc
+import aiohttp
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Optional
+
+import yaml
+
+from benchmark_async import BenchmarkResult, create_test_image, load_config
+
+
+@dataclass
+class StageResult:
+    """Aggregated measurements for one offered-load stage."""
+    offered_rps: float
+    achieved_rps: float
+    requests: int
+    failures: int
+    failure_rate: float
+    p50: float
+    p95: float
+    p99: float
+    passed: bool
+    reason: str = ""
+    cpu_cores: Optional[float] = None   # mean CPU per measured replica during the stage
+
+
+def parse_cpu(value) -> float:
+    """Convert a Kubernetes CPU quantity ("500m", "2", 1.5) to cores."""
+    value = str(value)
+    if value.endswith('m'):
+        return float(value[:-1]) / 1000
+    return float(value)
+
+
+class ProcessCpu:
+    """CPU time of a local backend process from /proc/<pid>/stat."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self._started = None
+
+    def _cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            # skip past "(comm)", which may contain spaces; utime..cstime are fields 14-17
+            fields = f.read().rsplit(')', 1)[1].split()
+        return sum(int(v) for v in fields[11:15]) / os.sysconf('SC_CLK_TCK')
+
+    async def start(self):
+        self._started = (self._cpu_seconds(), time.time())
+
+    async def stop(self) -> Optional[float]:
+        cpu, wall = self._started
+        elapsed = time.time() - wall
+        return (self._cpu_seconds() - cpu) / elapsed if elapsed > 0 else None
+
+
+class PolledCpu(abc.ABC):
+    """Average of periodic CPU readings (cores per replica) taken while a stage runs."""
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self._readings: List[float] = []
+        self._task = None
+
+    @abc.abstractmethod
+    async def read(self) -> List[float]:
+        """One CPU reading (cores) per replica."""
+
+    async def _run_command(self, *cmd) -> str:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"{' '.join(cmd)}: {stderr.decode().strip()}")
+        return stdout.decode()
+
+    async def _poll(self):
+        while True:
+            try:
+                self._readings.extend(await self.read())
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"  CPU sample failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        self._readings = []
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> Optional[float]:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return statistics.mean(self._readings) if self._readings else None
+
+
+class DockerCpu(PolledCpu):
+    """CPU of backend containers from `docker stats` (100% = one core)."""
+
+    def __init__(self, containers: List[str], interval: float = 5.0):
+        super().__init__(interval)
+        self.containers = containers
+
+    async def read(self) -> List[float]:
+        out = await self._run_command('docker', 'stats', '--no-stream', '--format', '{{.CPUPerc}}',
+                                      *self.containers)
+        return [float(line.strip().rstrip('%')) / 100 for line in out.splitlines() if line.strip()]
+
+
+class KubeCpu(PolledCpu):
+    """CPU of backend pods from `kubectl top` (needs metrics-server, which lags ~15-60s)."""
+
+    def __init__(self, selector: str, namespace: str, interval: float = 15.0):
+        super().__init__(interval)
+        self.selector = selector
+        self.namespace = namespace
+
+    async def read(self) -> List[float]:
+        out = await self._run_command('kubectl', 'top', 'pods', '-n', self.namespace,
+                                      '-l', self.selector, '--no-headers')
+        return [parse_cpu(line.split()[1]) for line in out.splitlines() if line.strip()]
+
+
+def load_helm_backend(path: Path) -> dict:
+    """Backend CPU request and current HPA target from the Helm values file."""
+    try:
+        with open(path) as f:
+            backend = yaml.safe_load(f).get('backend', {})
+    except OSError:
+        return {}
+    return {
+        'cpu_request': backend.get('resources', {}).get('requests', {}).get('cpu'),
+        'current_target': backend.get('autoscaling', {}).get('targetCPUUtilizationPercentage'),
+    }
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile, matching benchmark_async.print_summary."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+async def send_predict(session: aiohttp.ClientSession, url: str, payload: bytes) -> BenchmarkResult:
+    """Send one /predict request with a pre-encoded payload."""
+    start_time = time.time()
+    try:
+        data = aiohttp.FormData()
+        data.add_field('file', payload, filename='test.jpg', content_type='image/jpeg')
+        async with session.post(url, data=data, timeout=aiohttp.ClientTimeout(total=60)) as response:
+            await response.read()
+            return BenchmarkResult(
+                endpoint="/predict",
+                status_code=response.status,
+                response_time=time.time() - start_time,
+                success=response.status == 200
+            )
+    except Exception as e:
+        return BenchmarkResult(
+            endpoint="/predict",
+            status_code=0,
+            response_time=time.time() - start_time,
+            success=False,
+            error=str(e)
+        )
+
+
+async def run_stage(
+    base_url: str,
+    offered_rps: float,
+    duration: float,
+    payloads: List[bytes],
+    thresholds: dict,
+    max_in_flight: int,
+    min_throughput_ratio: float,
+    cpu=None
+) -> StageResult:
+    """Offer `offered_rps` for `duration` seconds and evaluate the thresholds.
+
+    Arrivals are scheduled on a fixed clock regardless of how fast responses
+    come back, so queueing inside the backend shows up as latency instead of
+    silently lowering the offered load. Arrivals that would exceed
+    `max_in_flight` outstanding requests are counted as failures, and a stage
+    whose achieved throughput falls below `min_throughput_ratio` of the offered
+    load fails because its queue is growing without bound. With a `cpu`
+    sampler, the backend's mean CPU over the stage is recorded as well.
+    """
+    url = f"{base_url}/predict?return_image=False"
+    interval = 1.0 / offered_rps
+    total = max(1, int(offered_rps * duration))
+    tasks = []
+    dropped = 0
+    in_flight = 0
+
+    async def tracked(session):
+        nonlocal in_flight
+        in_flight += 1
+        try:
+            return await send_predict(session, url, random.choice(payloads))
+        finally:
+            in_flight -= 1
+
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        if cpu is not None:
+            await cpu.start()
+        start_time = time.time()
+        for i in range(total):
+            delay = start_time + i * interval - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if in_flight >= max_in_flight:
+                dropped += 1
+                continue
+            tasks.append(asyncio.create_task(tracked(session)))
+        results = await asyncio.gather(*tasks)
+        elapsed = time.time() - start_time
+        cpu_cores = await cpu.stop() if cpu is not None else None
+
+    successes = sorted(r.response_time for r in results if r.success)
+    failures = dropped + sum(1 for r in results if not r.success)
+    requests = len(results) + dropped
+    failure_rate = failures / requests if requests else 1.0
+    achieved_rps = len(successes) / elapsed if elapsed > 0 else 0.0
+    p95 = percentile(successes, 0.95)
+    p99 = percentile(successes, 0.99)
+
+    reasons = []
+    max_failure_rate = thresholds.get('max_failure_rate', 0.01)
+    if failure_rate > max_failure_rate:
+        reasons.append(f"failure rate {failure_rate:.2%} > {max_failure_rate:.2%}")
+    max_p95 = thresholds.get('max_p95_response_time', 2.0)
+    if p95 > max_p95:
+        reasons.append(f"p95 {p95:.3f}s > {max_p95}s")
+    max_p99 = thresholds.get('max_p99_response_time', 5.0)
+    if p99 > max_p99:
+        reasons.append(f"p99 {p99:.3f}s > {max_p99}s")
+    if achieved_rps < offered_rps * min_throughput_ratio:
+        reasons.append(f"achieved {achieved_rps:.2f} < {min_throughput_ratio:.0%} of offered")
+
+    return StageResult(
+        offered_rps=offered_rps,
+        achieved_rps=achieved_rps,
+        requests=requests,
+        failures=failures,
+        failure_rate=failure_rate,
+        p50=percentile(successes, 0.50),
+        p95=p95,
+        p99=p99,
+        passed=not reasons,
+        reason="; ".join(reasons),
+        cpu_cores=cpu_cores
+    )
+
+
+def print_stage(stage: StageResult):
+    status = "✓ PASS" if stage.passed else "✗ FAIL"
+    print(f"  offered {stage.offered_rps:7.2f} req/s | achieved {stage.achieved_rps:7.2f} req/s | "
+          f"p50 {stage.p50:.3f}s p95 {stage.p95:.3f}s p99 {stage.p99:.3f}s | "
+          f"fail {stage.failure_rate:6.2%}"
+          + (f" | cpu {stage.cpu_cores:.2f}" if stage.cpu_cores is not None else "")
+          + f" {status}"
+          + (f" ({stage.reason})" if stage.reason else ""))
+
+
+async def search_capacity(base_url: str, settings: dict, thresholds: dict, payloads: List[bytes],
+                          cpu=None) -> List[StageResult]:
+    """Step the offered load until a stage fails, then binary-search the boundary."""
+    stages = []
+
+    async def measure(rps):
+        stage = await run_stage(base_url, rps, settings['stage_duration'], payloads,
+                                thresholds, settings['max_in_flight'], settings['min_throughput_ratio'], cpu)
+        stages.append(stage)
+        print_stage(stage)
+        if settings['cooldown'] > 0:
+            await asyncio.sleep(settings['cooldown'])
+        return stage
+
+    print("\nStep phase:")
+    last_pass: Optional[float] = None
+    first_fail: Optional[float] = None
+    rps = settings['start_rps']
+    while rps <= settings['max_rps']:
+        stage = await measure(rps)
+        if not stage.passed:
+            first_fail = rps
+            break
+        last_pass = rps
+        rps += settings['step_rps']
+
+    if first_fail is None:
+        print(f"\nNo threshold violated up to {settings['max_rps']} req/s; raise max_rps to find saturation.")
+        return stages
+
+    low = last_pass or 0.0
+    high = first_fail
+    print("\nBinary search phase:")
+    while high - low > settings['resolution_rps']:
+        mid = (low + high) / 2
+        if mid <= 0:
+            break
+        if (await measure(mid)).passed:
+            low = mid
+        else:
+            high = mid
+
+    return stages
+
+
+def recommend_hpa(max_rps_per_replica: float, cpu_cores: Optional[float], settings: dict) -> dict:
+    """Derive HPA settings from the measured per-replica capacity.
+
+    `cpu_cores` is the CPU a replica used at the highest passing stage. The HPA
+    compares usage against the CPU *request*, so that is the utilization a pod
+    shows when it is at its sustainable limit; scaling out at `headroom` of it
+    leaves room for new pods to become ready before latency degrades.
+    """
+    headroom = settings['headroom']
+    target_rps = max_rps_per_replica * headroom
+    recommendation = {
+        'target_rps_per_replica': round(target_rps, 2),
+    }
+    if cpu_cores is not None:
+        utilization = cpu_cores / parse_cpu(settings['cpu_request']) * 100
+        recommendation['measured_cpu_cores'] = round(cpu_cores, 3)
+        recommendation['measured_cpu_utilization_percentage'] = round(utilization, 1)
+        recommendation['targetCPUUtilizationPercentage'] = max(1, int(round(headroom * utilization)))
+    peak_rps = settings.get('peak_rps')
+    if peak_rps and target_rps > 0:
+        recommendation['minReplicas_for_peak'] = max(1, math.ceil(peak_rps / target_rps))
+    return recommendation
+
+
+def print_report(stages: List[StageResult], settings: dict) -> dict:
+    """Print the knee curve and the capacity recommendation."""
+    curve = sorted(stages, key=lambda s: s.offered_rps)
+    passing = [s for s in curve if s.passed]
+
+    print(f"\n{'='*70}")
+    print("CAPACITY SEARCH RESULTS")
+    print(f"{'='*70}")
+    print("\nKnee curve (offered vs achieved throughput and latency):")
+    print(f"  {'offered':>9} {'achieved':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'fail':>7} {'cpu':>6}")
+    for s in curve:
+        mark = "" if s.passed else "  <- violates thresholds"
+        cpu = f"{s.cpu_cores:6.2f}" if s.cpu_cores is not None else f"{'-':>6}"
+        print(f"  {s.offered_rps:9.2f} {s.achieved_rps:9.2f} {s.p50:8.3f} {s.p95:8.3f} {s.p99:8.3f} "
+              f"{s.failure_rate:7.2%} {cpu}{mark}")
+
+    report = {
+        'replicas': settings['replicas'],
+        'stages': [asdict(s) for s in curve],
+    }
+    if not passing:
+        print("\nNo stage met the thresholds; lower start_rps.")
+        print(f"{'='*70}\n")
+        return report
+
+    best = max(passing, key=lambda s: s.achieved_rps)
+    max_rps_per_replica = best.achieved_rps / settings['replicas']
+    recommendation = recommend_hpa(max_rps_per_replica, best.cpu_cores, settings)
+    report['max_sustainable_rps'] = round(best.achieved_rps, 2)
+    report['max_sustainable_rps_per_replica'] = round(max_rps_per_replica, 2)
+    report['hpa'] = recommendation
+
+    print(f"\nMax sustainable throughput: {best.achieved_rps:.2f} req/s "
+          f"({settings['replicas']} replica(s), p95 {best.p95:.3f}s, p99 {best.p99:.3f}s)")
+    print(f"Max sustainable RPS per replica: {max_rps_per_replica:.2f}")
+    print(f"\nRecommended HPA (headroom {settings['headroom']:.0%}, cpu request {settings['cpu_request']}):")
+    print(f"  Scale out at ~{recommendation['target_rps_per_replica']} req/s per replica")
+    current = settings.get('current_target')
+    if 'targetCPUUtilizationPercentage' in recommendation:
+        print(f"  Measured CPU at {best.achieved_rps:.2f} req/s: {recommendation['measured_cpu_cores']:.2f} cores "
+              f"per replica ({recommendation['measured_cpu_utilization_percentage']:.0f}% of request)")
+        print(f"  targetCPUUtilizationPercentage: {recommendation['targetCPUUtilizationPercentage']}"
+              + (f" (currently {current})" if current is not None else ""))
+    else:
+        print("  targetCPUUtilizationPercentage: not measured; pass --pid, --docker or --kube-selector"
+              + (f" (currently {current})" if current is not None else ""))
+    if current is not None:
+        report['current_targetCPUUtilizationPercentage'] = current
+    if 'minReplicas_for_peak' in recommendation:
+        print(f"  minReplicas for {settings['peak_rps']} req/s peak: {recommendation['minReplicas_for_peak']}")
+    print(f"{'='*70}\n")
+    return report
+
+
+def main():
+    config = load_config()
+    defaults = config.get('capacity_search', {})
+
+    parser = argparse.ArgumentParser(description='Capacity search for YOLO API')
+    parser.add_argument('--env', type=str, choices=list(config['environments'].keys()),
+                       help='Environment to test: local (Docker Compose), swarm (Docker Swarm), k8s (Kubernetes)')
+    parser.add_argument('--url', type=str,
+                       help='Custom API URL (overrides --env)')
+    parser.add_argument('--replicas', type=int, default=defaults.get('replicas', 1),
+                       help='Number of backend replicas behind the URL')
+    parser.add_argument('--start-rps', type=float, default=defaults.get('start_rps', 1),
+                       help='First offered load (req/s)')
+    parser.add_argument('--step-rps', type=float, default=defaults.get('step_rps', 2),
+                       help='Offered load increment per step (req/s)')
+    parser.add_argument('--max-rps', type=float, default=defaults.get('max_rps', 200),
+                       help='Stop stepping at this offered load (req/s)')
+    parser.add_argument('--resolution-rps', type=float, default=defaults.get('resolution_rps', 0.5),
+                       help='Binary search stops when the bracket is narrower than this')
+    parser.add_argument('--stage-duration', type=float, default=defaults.get('stage_duration', 30),
+                       help='Seconds to hold each offered load')
+    parser.add_argument('--cooldown', type=float, default=defaults.get('cooldown', 5),
+                       help='Seconds to idle between stages so queues drain')
+    parser.add_argument('--max-in-flight', type=int, default=defaults.get('max_in_flight', 256),
+                       help='Outstanding requests before new arrivals count as failures')
+    parser.add_argument('--min-throughput-ratio', type=float, default=defaults.get('min_throughput_ratio', 0.9),
+                       help='Fail a stage when achieved/offered throughput drops below this')
+    parser.add_argument('--headroom', type=float, default=defaults.get('headroom', 0.7),
+                       help='Fraction of sustainable load at which the HPA should scale out')
+    parser.add_argument('--peak-rps', type=float, default=defaults.get('peak_rps'),
+                       help='Expected peak traffic, used to recommend minReplicas')
+    parser.add_argument('--pid', type=int,
+                       help='Sample CPU of a local backend process')
+    parser.add_argument('--docker', type=str,
+                       help='Sample CPU of these backend containers via docker stats (comma-separated)')
+    parser.add_argument('--kube-selector', type=str,
+                       help='Sample CPU of the pods matching this label selector via kubectl top')
+    parser.add_argument('--namespace', type=str, default=defaults.get('namespace', 'yolo-app'),
+                       help='Namespace for --kube-selector')
+    parser.add_argument('--cpu-request', type=str,
+                       help='Backend CPU request the HPA measures against (default: from the Helm values)')
+    parser.add_argument('--output', type=str,
+                       help='Write the knee curve and recommendation as JSON')
+
+    args = parser.parse_args()
+
+    if sum(bool(source) for source in (args.pid, args.docker, args.kube_selector)) > 1:
+        parser.error("use only one of --pid, --docker and --kube-selector")
+    if args.pid:
+        cpu = ProcessCpu(args.pid)
+    elif args.docker:
+        cpu = DockerCpu([c.strip() for c in args.docker.split(',') if c.strip()])
+    elif args.kube_selector:
+        cpu = KubeCpu(args.kube_selector, args.namespace)
+    else:
+        cpu = None
+
+    helm = load_helm_backend(Path(__file__).parent / defaults.get('helm_values', '../helm/yolo-app/values.yaml'))
+
+    if args.url:
+        base_url = args.url
+        print(f"Using custom URL: {base_url}")
+    else:
+        env_name = args.env or 'local'
+        env_config = config['environments'][env_name]
+        base_url = env_config['url']
+        print(f"Using environment '{env_name}': {env_config['description']}")
+
+    settings = {
+        'replicas': args.replicas,
+        'start_rps': args.start_rps,
+        'step_rps': args.step_rps,
+        'max_rps': args.max_rps,
+        'resolution_rps': args.resolution_rps,
+        'stage_duration': args.stage_duration,
+        'cooldown': args.cooldown,
+        'max_in_flight': args.max_in_flight,
+        'min_throughput_ratio': args.min_throughput_ratio,
+        'headroom': args.headroom,
+        'peak_rps': args.peak_rps,
+        'cpu_request': args.cpu_request or helm.get('cpu_request') or '500m',
+        'current_target': helm.get('current_target'),
+    }
+
+    width, height = config.get('image_sizes', {}).get('small', [640, 480])
+    payloads = [create_test_image(width, height) for _ in range(defaults.get('payload_pool', 16))]
+
+    print(f"\n{'='*70}")
+    print("YOLO Backend API - Capacity Search")
+    print(f"{'='*70}")
+    print(f"Target URL: {base_url}")
+    print(f"Replicas: {settings['replicas']}")
+    print(f"Stage duration: {settings['stage_duration']}s, step: {settings['step_rps']} req/s")
+    print(f"Thresholds: {config.get('thresholds', {})}")
+    print(f"CPU source: {type(cpu).__name__ if cpu else 'none (no CPU-based HPA target)'}")
+
+    stages = asyncio.run(search_capacity(base_url, settings, config.get('thresholds', {}), payloads, cpu))
+    report = print_report(stages, settings)
+
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(json.dumps(report, indent=2))
+        print(f"Report written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
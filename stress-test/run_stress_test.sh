@@ -76,15 +76,53 @@ run_async_benchmark() {
     fi
 }
 
+# Run capacity search
+run_capacity_search() {
+    local env=$1
+    local url=$2
+    local cpu_source=$3
+    
+    # Without a CPU source no HPA target can be recommended; default to the
+    # Compose container locally and the backend pods on Kubernetes
+    if [ -z "$cpu_source" ]; then
+        case "$env" in
+            local) cpu_source="docker:yolo-backend" ;;
+            k8s) cpu_source="kube:app=backend" ;;
+        esac
+    fi
+    local cpu_args=()
+    case "$cpu_source" in
+        docker:*) cpu_args=(--docker "${cpu_source#docker:}") ;;
+        kube:*) cpu_args=(--kube-selector "${cpu_source#kube:}") ;;
+        pid:*) cpu_args=(--pid "${cpu_source#pid:}") ;;
+        ""|none) print_warning "No CPU source; the report will have no CPU-based HPA target (see --cpu-source)" ;;
+        *)
+            print_error "Unknown CPU source: $cpu_source"
+            exit 1
+            ;;
+    esac
+    
+    mkdir -p "${RESULTS_DIR}"
+    local output="${RESULTS_DIR}/capacity_${env:-custom}_$(date +%Y%m%d_%H%M%S).json"
+    if [ -n "$url" ]; then
+        python3 "${SCRIPT_DIR}/capacity_search.py" --url "$url" "${cpu_args[@]}" --output "$output"
+    else
+        python3 "${SCRIPT_DIR}/capacity_search.py" --env "${env:-local}" "${cpu_args[@]}" --output "$output"
+    fi
+}
+
 # Run locust web UI
 run_locust_web() {
     local url=$1
+    local profile=$2
     print_info "Starting Locust web UI..."
     print_info "Open http://localhost:8089 in your browser"
     locust -f "${SCRIPT_DIR}/stress_test.py" \
         --host="${url}" \
         --web-host=0.0.0.0 \
-        --web-port=8089
+        --web-port=8089 \
+        ${profile:+--profile "$profile"} \
+        ${FAST_HTTP:+--fast-http}
 }
 
 # Run locust headless
@@ -100,13 +138,13 @@ run_locust_headless() {
         print_info "Running profile: $profile"
         print_info "Users: $users, Spawn rate: $spawn_rate, Duration: $duration"
         
+        # users, spawn rate and duration come from the profile's load shape
         mkdir -p "${RESULTS_DIR}"
         locust -f "${SCRIPT_DIR}/stress_test.py" \
             --host="${url}" \
             --headless \
-            -u "$users" \
-            -r "$spawn_rate" \
-            -t "$duration" \
+            --profile "$profile" \
+            ${FAST_HTTP:+--fast-http} \
             --html="${RESULTS_DIR}/${profile}_report_$(date +%Y%m%d_%H%M%S).html" \
             --csv="${RESULTS_DIR}/${profile}_$(date +%Y%m%d_%H%M%S)"
     else
@@ -131,7 +169,7 @@ import yaml
 config = yaml.safe_load(open('$CONFIG_FILE'))
 for profile, details in config['test_profiles'].items():
     print(f\"  {profile:15} - {details['description']}\")
-    print(f\"                    Users: {details['users']}, Spawn rate: {details['spawn_rate']}, Duration: {details['duration']}\")
+    print(f\"                    Users: {details['users']}, Spawn rate: {details['spawn_rate']}, Duration: {details['duration']}, Shape: {details.get('shape', 'ramp')}\")
 "
     echo
 }
@@ -147,7 +185,11 @@ Options:
     -e, --env <env>          Environment to test (local, swarm, k8s)
     -p, --profile <profile>  Test profile (smoke, quick, standard, load, spike, endurance, stress)
     -u, --url <url>          Custom API URL (overrides --env)
-    -m, --mode <mode>        Test mode: async (default), web, headless
+    -m, --mode <mode>        Test mode: async (default), web, headless, capacity
+    --fast-http              Locust modes: use FastHttpUser instead of HttpUser
+    --cpu-source <source>    Capacity mode: docker:<containers>, kube:<selector>, pid:<pid>
+                             or none (default: docker:yolo-backend for local,
+                             kube:app=backend for k8s)
     -l, --list               List available environments and profiles
     -h, --help               Show this help message
 
@@ -164,6 +206,13 @@ Examples:
     # Locust web UI for interactive testing
     $0 --env local --mode web
 
+    # Spike profile on the faster Locust HTTP client
+    $0 --env local --profile spike --mode headless --fast-http
+
+    # Find max sustainable RPS and a recommended HPA target
+    $0 --env local --mode capacity
+    $0 --url http://localhost:8000 --mode capacity --cpu-source pid:12345
+
     # Custom URL
     $0 --url http://localhost:8000 --profile standard
 
@@ -180,6 +229,8 @@ main() {
     PROFILE=""
     URL=""
     MODE="async"
+    FAST_HTTP=""
+    CPU_SOURCE=""
     
     # Parse arguments
     while [[ $# -gt 0 ]]; do
@@ -200,6 +251,14 @@ main() {
                 MODE="$2"
                 shift 2
                 ;;
+            --fast-http)
+                FAST_HTTP=1
+                shift
+                ;;
+            --cpu-source)
+                CPU_SOURCE="$2"
+                shift 2
+                ;;
             -l|--list)
                 list_options
                 exit 0
@@ -242,11 +301,15 @@ main() {
             run_async_benchmark "$ENV" "$PROFILE" "$URL"
             ;;
         web)
-            run_locust_web "$TARGET_URL"
+            run_locust_web "$TARGET_URL" "$PROFILE"
             ;;
         headless)
             run_locust_headless "$TARGET_URL" "$PROFILE"
             ;;
+        capacity)
+            print_info "Running capacity search..."
+            run_capacity_search "$ENV" "$URL" "$CPU_SOURCE"
+            ;;
         *)
             print_error "Unknown mode: $MODE"
             show_usage
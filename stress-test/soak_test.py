@@ -0,0 +1,331 @@
+"""
+Endurance soak test for the YOLO backend, tracking resource leaks.
+
+Drives /predict for hours and samples the backend process's RSS, open file
+descriptors and temp-dir size (plus tracemalloc top allocators when running
+in-process). After a warmup, a least-squares slope is fitted to each series
+and the run fails if any grows faster than the limits in the `soak` section
+of config.yaml.
+
+Modes:
+    # In-process: imports backend/api.py and drives it with FastAPI's TestClient.
+    # --fake-model swaps in a stub so only the serving path is exercised.
+    python soak_test.py --duration 2h --fake-model
+    python soak_test.py --duration 30m                 # real model (needs backend deps)
+
+    # Local server: drive a running backend over HTTP and watch its PID
+    python soak_test.py --url http://localhost:8000 --pid $(pgrep -f "uvicorn api:app") --duration 4h
+"""
+
+import argparse
+import csv
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict, fields
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from benchmark_async import create_test_image, load_config, parse_duration
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+@dataclass
+class Sample:
+    """Resource usage of the backend process at one point in time."""
+    elapsed: float
+    requests: int
+    failures: int
+    rss_mb: float
+    open_fds: int
+    temp_files: int
+    temp_mb: float
+
+
+def read_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def count_fds(pid: int) -> int:
+    return len(os.listdir(f"/proc/{pid}/fd"))
+
+
+def temp_dir_usage(path: str):
+    files, size = 0, 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                pass  # removed while walking
+    return files, size / (1024 * 1024)
+
+
+def slope_per_hour(xs: List[float], ys: List[float]) -> float:
+    """Least-squares slope of ys over xs (seconds), scaled to units per hour."""
+    if len(xs) < 2:
+        return 0.0
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    if var == 0:
+        return 0.0
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    return cov / var * 3600
+
+
+class _FakeTensor:
+    def __init__(self, values):
+        self._values = values
+
+    def tolist(self):
+        return [self._values]
+
+
+class _FakeBox:
+    def __init__(self):
+        self.xyxy = _FakeTensor([10.0, 20.0, 110.0, 220.0])
+        self.conf = _FakeTensor(0.9)
+        self.cls = _FakeTensor(0)
+
+
+class _FakeResult:
+    def __init__(self, source):
+        self.boxes = [_FakeBox()]
+        self._shape = source.shape if isinstance(source, np.ndarray) else (480, 640, 3)
+
+    def plot(self):
+        return np.zeros(self._shape, dtype=np.uint8)
+
+
+class FakeModel:
+    """Stand-in for the Ultralytics model: same call shape, no inference cost."""
+
+    def __call__(self, sources):
+        return [_FakeResult(s) for s in sources]
+
+
+class InProcessTarget:
+    """Backend imported into this process and called through TestClient."""
+
+    def __init__(self, fake_model: bool):
+        sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+        import api
+        from fastapi.testclient import TestClient
+
+        # one access-log line per request would drown the sample output
+        logging.getLogger("api.access").setLevel(logging.WARNING)
+        if fake_model:
+            api.model_handler.model = FakeModel()
+        self._client_cm = TestClient(api.app)
+        self.client = self._client_cm.__enter__()
+        self.pid = os.getpid()
+
+    def post(self, payload: bytes, return_image: bool) -> bool:
+        r = self.client.post("/predict", params={"return_image": return_image},
+                             files={"file": ("soak.jpg", payload, "image/jpeg")})
+        return r.status_code == 200
+
+    def close(self):
+        self._client_cm.__exit__(None, None, None)
+
+
+class HttpTarget:
+    """Running backend reached over HTTP, sampled through its PID."""
+
+    def __init__(self, url: str, pid: int):
+        import requests
+        self.session = requests.Session()
+        self.url = url.rstrip('/')
+        self.pid = pid
+
+    def post(self, payload: bytes, return_image: bool) -> bool:
+        try:
+            r = self.session.post(f"{self.url}/predict", params={"return_image": return_image},
+                                  files={"file": ("soak.jpg", payload, "image/jpeg")}, timeout=60)
+            return r.status_code == 200
+        except Exception:
+            return False
+
+    def close(self):
+        self.session.close()
+
+
+def run_soak(target, duration: float, warmup: float, interval: float, concurrency: int,
+             payloads: List[bytes], image_ratio: float, temp_dir: str, top_allocators: int):
+    counters = {"requests": 0, "failures": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def drive():
+        while not stop.is_set():
+            ok = target.post(random.choice(payloads), random.random() < image_ratio)
+            with lock:
+                counters["requests"] += 1
+                if not ok:
+                    counters["failures"] += 1
+
+    in_process = isinstance(target, InProcessTarget)
+    if in_process:
+        tracemalloc.start(10)
+    baseline = None
+
+    threads = [threading.Thread(target=drive, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+
+    samples: List[Sample] = []
+    start_time = time.time()
+    try:
+        while True:
+            elapsed = time.time() - start_time
+            temp_files, temp_mb = temp_dir_usage(temp_dir)
+            with lock:
+                sample = Sample(elapsed, counters["requests"], counters["failures"],
+                                read_rss_mb(target.pid), count_fds(target.pid), temp_files, temp_mb)
+            samples.append(sample)
+            print(f"[{elapsed / 60:7.1f}m] requests {sample.requests:8d} (fail {sample.failures}) | "
+                  f"RSS {sample.rss_mb:8.1f} MB | FDs {sample.open_fds:5d} | "
+                  f"temp {sample.temp_files} files / {sample.temp_mb:.1f} MB")
+            # compare against the first steady-state sample, like the slope fit
+            if in_process and baseline is None and elapsed >= warmup:
+                baseline = tracemalloc.take_snapshot()
+            if elapsed >= duration:
+                break
+            time.sleep(min(interval, max(duration - elapsed, 0.1)))
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=60)
+
+    growth = []
+    if in_process and baseline is not None:
+        snapshot = tracemalloc.take_snapshot()
+        growth = snapshot.compare_to(baseline, 'lineno')[:top_allocators]
+        tracemalloc.stop()
+    return samples, growth
+
+
+def evaluate(samples: List[Sample], warmup: float, limits: dict) -> bool:
+    steady = [s for s in samples if s.elapsed >= warmup] or samples
+    xs = [s.elapsed for s in steady]
+    checks = [
+        ("RSS", "MB/h", [s.rss_mb for s in steady], limits.get('max_rss_mb_per_hour', 50)),
+        ("Open FDs", "/h", [s.open_fds for s in steady], limits.get('max_fds_per_hour', 10)),
+        ("Temp files", "/h", [s.temp_files for s in steady], limits.get('max_temp_files_per_hour', 10)),
+        ("Temp size", "MB/h", [s.temp_mb for s in steady], limits.get('max_temp_mb_per_hour', 10)),
+    ]
+
+    print(f"\nGrowth after {warmup:.0f}s warmup ({len(steady)} samples):")
+    passed = True
+    for name, unit, ys, limit in checks:
+        slope = slope_per_hour(xs, ys)
+        ok = slope <= limit
+        passed = passed and ok
+        status = "✓ PASS" if ok else "✗ FAIL"
+        print(f"  {name + ':':12} {slope:+10.2f} {unit:5} (max: {limit}) {status}")
+
+    total = samples[-1].requests if samples else 0
+    failures = samples[-1].failures if samples else 0
+    max_failure_rate = limits.get('max_failure_rate', 0.01)
+    failure_rate = failures / total if total else 0.0
+    ok = failure_rate <= max_failure_rate
+    passed = passed and ok
+    print(f"  {'Failures:':12} {failure_rate:10.2%}       (max: {max_failure_rate:.2%}) "
+          f"{'✓ PASS' if ok else '✗ FAIL'}")
+    return passed
+
+
+def main():
+    config = load_config()
+    soak = config.get('soak', {})
+    profile = config['test_profiles'].get('endurance', {})
+
+    parser = argparse.ArgumentParser(description='Soak test the YOLO backend for resource leaks')
+    parser.add_argument('--url', type=str,
+                       help='Drive a running backend over HTTP instead of in-process')
+    parser.add_argument('--pid', type=int,
+                       help='PID of the backend process to sample (required with --url)')
+    parser.add_argument('--fake-model', action='store_true',
+                       help='In-process only: replace the model with a zero-cost stub')
+    parser.add_argument('--duration', type=str, default=soak.get('duration', profile.get('duration', '30m')),
+                       help='How long to run, e.g. 30m, 4h')
+    parser.add_argument('--warmup', type=str, default=soak.get('warmup', '5m'),
+                       help='Samples before this are excluded from the slope fit')
+    parser.add_argument('--interval', type=str, default=soak.get('sample_interval', '30s'),
+                       help='Time between resource samples')
+    parser.add_argument('--concurrency', type=int, default=soak.get('concurrency', 4),
+                       help='Concurrent request loops')
+    parser.add_argument('--temp-dir', type=str,
+                       help='Temp directory the backend writes to (default: a fresh directory in-process; '
+                            'with --url, start the backend with TMPDIR set to the same path)')
+    args = parser.parse_args()
+
+    if args.url and not args.pid:
+        parser.error("--pid is required with --url")
+
+    if args.temp_dir is None:
+        if args.url:
+            args.temp_dir = tempfile.gettempdir()
+            print(f"Warning: watching the shared {args.temp_dir}; other processes' files add noise. "
+                  f"Start the backend with TMPDIR=<dir> and pass --temp-dir <dir>.")
+        else:
+            args.temp_dir = tempfile.mkdtemp(prefix="yolo-soak-")
+    if not args.url:
+        # everything the in-process backend creates via tempfile lands here
+        tempfile.tempdir = args.temp_dir
+
+    width, height = config.get('image_sizes', {}).get('small', [640, 480])
+    payloads = [create_test_image(width, height) for _ in range(soak.get('payload_pool', 16))]
+    target = HttpTarget(args.url, args.pid) if args.url else InProcessTarget(args.fake_model)
+
+    duration = parse_duration(args.duration)
+    print(f"\n{'='*70}")
+    print("YOLO Backend API - Soak Test")
+    print(f"{'='*70}")
+    print(f"Target: {args.url or 'in-process'}{' (fake model)' if args.fake_model and not args.url else ''}")
+    print(f"PID: {target.pid}")
+    print(f"Duration: {args.duration}, warmup: {args.warmup}, sample every {args.interval}")
+    print(f"Temp dir: {args.temp_dir}")
+    print(f"{'-'*70}")
+
+    try:
+        samples, growth = run_soak(
+            target, duration, parse_duration(args.warmup), parse_duration(args.interval), args.concurrency, payloads,
+            soak.get('return_image_ratio', 0.2), args.temp_dir, soak.get('top_allocators', 10))
+    finally:
+        target.close()
+
+    if growth:
+        print(f"\nTop allocation growth since the end of warmup (tracemalloc):")
+        for stat in growth:
+            print(f"  {stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  {stat.traceback[0]}")
+
+    passed = evaluate(samples, parse_duration(args.warmup), soak)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    csv_path = RESULTS_DIR / f"soak_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(Sample)])
+        writer.writeheader()
+        writer.writerows(asdict(s) for s in samples)
+    print(f"\nSamples written to {csv_path}")
+    print(f"{'='*70}\n")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 """
 Stress test for the YOLO backend API using Locust.
-Supports multiple environments and test profiles.
+Supports multiple environments and test profiles. With --profile the load
+follows the profile's ramp/spike/step schedule from config.yaml; without it
+the usual -u/-r/-t options apply.
 
 Usage:
     # Interactive mode with web UI
@@ -9,19 +11,26 @@ Usage:
     # Headless mode
     locust -f stress_test.py --host=http://localhost:8000 --headless -u 10 -r 2 -t 60s
     
+    # Headless, scheduled by a profile, on the faster HTTP client
+    locust -f stress_test.py --host=http://localhost:8000 --headless --profile spike --fast-http
+    
     # Using the helper script
     ./run_stress_test.sh --env local --profile standard
 """
 
-from locust import HttpUser, task, between, events
+from locust import HttpUser, FastHttpUser, LoadTestShape, User, task, between, events
+import argparse
 import io
-import os
+import uuid
 import yaml
 import random
 import glob
 from PIL import Image
 import numpy as np
 from pathlib import Path
+from typing import List, Optional, Tuple
+
+from benchmark_async import parse_duration
 
 
 # Load configuration
@@ -38,6 +47,10 @@ else:
     IMAGE_POOL = []
     print(f"Warning: {VAL2014_DIR} not found, will generate synthetic images")
 
+# Pre-encoded multipart bodies per image size, filled in on init so tasks
+# never touch PIL or the disk while the test runs
+PAYLOADS = {}
+
 
 def create_test_image(width=640, height=480):
     """Load a random image from val2014 or create a synthetic one."""
@@ -69,41 +82,69 @@ def create_test_image(width=640, height=480):
         return img_bytes
 
 
-class YOLOAPIUser(HttpUser):
-    """Simulates a user interacting with the YOLO API."""
+def encode_multipart(filename: str, data: bytes) -> Tuple[bytes, str]:
+    """Build a multipart/form-data body with a single `file` field."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def build_payload_pool(width: int, height: int, count: int, filename: str):
+    return [encode_multipart(filename, create_test_image(width, height).getvalue()) for _ in range(count)]
+
+
+def profile_stages(profile: dict) -> List[Tuple[float, int, float]]:
+    """Expand a test profile into (end_time_seconds, users, spawn_rate) stages.
+
+    `shape` selects the schedule:
+      ramp  - spawn up to `users` at `spawn_rate` and hold for `duration` (default)
+      spike - hold `baseline_users`, jump to `users` at `spike_at` for
+              `spike_duration`, then drop back to the baseline
+      step  - add `step_users` every `step_duration` until `users`, then hold
+    """
+    users = profile['users']
+    spawn_rate = profile['spawn_rate']
+    duration = parse_duration(profile['duration'])
+    shape = profile.get('shape', 'ramp')
+
+    if shape == 'ramp':
+        return [(duration, users, spawn_rate)]
+    if shape == 'spike':
+        baseline = profile.get('baseline_users', max(1, users // 10))
+        spike_at = parse_duration(profile.get('spike_at', duration / 4))
+        spike_end = spike_at + parse_duration(profile.get('spike_duration', duration / 4))
+        return [(spike_at, baseline, spawn_rate), (spike_end, users, spawn_rate), (duration, baseline, spawn_rate)]
+    if shape == 'step':
+        step_users = profile.get('step_users', max(1, users // 5))
+        step_duration = parse_duration(profile.get('step_duration', duration / 5))
+        stages = []
+        end, count = step_duration, step_users
+        while count < users and end < duration:
+            stages.append((end, count, spawn_rate))
+            end, count = end + step_duration, count + step_users
+        stages.append((duration, users, spawn_rate))
+        return stages
+    raise ValueError(f"unknown shape {shape!r} (expected ramp, spike or step)")
+
+
+class YOLOUserBase(User):
+    """Task mix shared by the HttpUser and FastHttpUser variants."""
     
+    abstract = True
     wait_time = between(1, 3)
     
-    def on_start(self):
-        """Called when a simulated user starts."""
-        # Optional: perform any initialization
-        self.image_sizes = config.get('image_sizes', {
-            'small': [640, 480],
-            'medium': [1280, 720],
-            'large': [1920, 1080]
-        })
-    
-    @task(10)  # Weight: 10
-    def health_check(self):
-        """Test the health endpoint."""
-        with self.client.get("/health", catch_response=True) as response:
-            if response.status_code == 200:
-                response.success()
-            else:
-                response.failure(f"Health check failed with status {response.status_code}")
-    
-    @task(60)  # Weight: 60
-    def predict_without_image(self):
-        """Test the predict endpoint without returning annotated image."""
-        width, height = self.image_sizes['small']
-        img_bytes = create_test_image(width, height)
-        
+    def _predict(self, size, return_image, name):
+        body, content_type = random.choice(PAYLOADS[size])
         with self.client.post(
-            "/predict",
-            files={"file": ("test_image.jpg", img_bytes, "image/jpeg")},
-            params={"return_image": False},
+            f"/predict?return_image={str(return_image).lower()}",
+            data=body,
+            headers={"Content-Type": content_type},
             catch_response=True,
-            name="/predict?return_image=False"
+            name=name
         ) as response:
             if response.status_code == 200:
                 try:
@@ -117,55 +158,74 @@ class YOLOAPIUser(HttpUser):
             else:
                 response.failure(f"Predict failed with status {response.status_code}")
     
+    @task(10)  # Weight: 10
+    def health_check(self):
+        """Test the health endpoint."""
+        with self.client.get("/health", catch_response=True) as response:
+            if response.status_code == 200:
+                response.success()
+            else:
+                response.failure(f"Health check failed with status {response.status_code}")
+    
+    @task(60)  # Weight: 60
+    def predict_without_image(self):
+        """Test the predict endpoint without returning annotated image."""
+        self._predict('small', False, "/predict?return_image=False")
+    
     @task(20)  # Weight: 20
     def predict_with_image(self):
         """Test the predict endpoint with annotated image return."""
-        width, height = self.image_sizes['small']
-        img_bytes = create_test_image(width, height)
-        
-        with self.client.post(
-            "/predict",
-            files={"file": ("test_image.jpg", img_bytes, "image/jpeg")},
-            params={"return_image": True},
-            catch_response=True,
-            name="/predict?return_image=True"
-        ) as response:
-            if response.status_code == 200:
-                try:
-                    json_response = response.json()
-                    if "predictions" in json_response:
-                        response.success()
-                    else:
-                        response.failure("Response missing 'predictions' field")
-                except Exception as e:
-                    response.failure(f"Failed to parse JSON: {str(e)}")
-            else:
-                response.failure(f"Predict failed with status {response.status_code}")
+        self._predict('small', True, "/predict?return_image=True")
     
     @task(10)  # Weight: 10
     def predict_large_image(self):
         """Test the predict endpoint with larger images."""
-        width, height = self.image_sizes['large']
-        img_bytes = create_test_image(width, height)
+        self._predict('large', False, "/predict (large image)")
+
+
+class YOLOAPIUser(YOLOUserBase, HttpUser):
+    """Simulates a user interacting with the YOLO API (requests-based client)."""
+
+
+class YOLOFastAPIUser(YOLOUserBase, FastHttpUser):
+    """Same task mix on locust's geventhttpclient-based client (--fast-http)."""
+
+
+def selected_user_classes(environment) -> Optional[list]:
+    """The user class picked by --fast-http, unless excluded on the command line."""
+    options = environment.parsed_options
+    chosen = YOLOFastAPIUser if getattr(options, 'fast_http', False) else YOLOAPIUser
+    return [chosen] if chosen in environment.user_classes else None
+
+
+class ProfileShape(LoadTestShape):
+    """Drives the run from the --profile schedule; plain -u/-r/-t without one."""
+    
+    use_common_options = True
+    
+    def __init__(self):
+        super().__init__()
+        self._stages = None
+    
+    def tick(self):
+        environment = self.runner.environment
+        options = environment.parsed_options
+        user_classes = selected_user_classes(environment)
         
-        with self.client.post(
-            "/predict",
-            files={"file": ("test_large_image.jpg", img_bytes, "image/jpeg")},
-            params={"return_image": False},
-            catch_response=True,
-            name="/predict (large image)"
-        ) as response:
-            if response.status_code == 200:
-                try:
-                    json_response = response.json()
-                    if "predictions" in json_response:
-                        response.success()
-                    else:
-                        response.failure("Response missing 'predictions' field")
-                except Exception as e:
-                    response.failure(f"Failed to parse JSON: {str(e)}")
-            else:
-                response.failure(f"Predict failed with status {response.status_code}")
+        profile_name = getattr(options, 'profile', None)
+        if not profile_name:
+            # headless locust waits on the shape before arming --run-time, so honour it here
+            if options.run_time and self.get_run_time() >= options.run_time:
+                return None
+            return options.num_users or 1, options.spawn_rate or 1, user_classes
+        
+        if self._stages is None:
+            self._stages = profile_stages(config['test_profiles'][profile_name])
+        run_time = self.get_run_time()
+        for end, users, spawn_rate in self._stages:
+            if run_time < end:
+                return users, spawn_rate, user_classes
+        return None
 
 
 @events.init_command_line_parser.add_listener
@@ -173,8 +233,30 @@ def _(parser):
     """Add custom command line arguments."""
     parser.add_argument("--env", type=str, default="local",
                        help="Environment to test (local, docker, kubernetes, staging, production)")
-    parser.add_argument("--profile", type=str,
-                       help="Test profile (smoke, quick, standard, load, spike, endurance, stress)")
+    try:
+        parser.add_argument("--profile", type=str,
+                           help="Test profile (smoke, quick, standard, load, spike, endurance, stress); "
+                                "drives users and duration from config.yaml")
+    except argparse.ArgumentError:
+        # newer locust ships its own --profile (a run label); its value lands in
+        # options.profile all the same
+        pass
+    parser.add_argument("--fast-http", action="store_true", default=False,
+                       help="Use FastHttpUser (geventhttpclient) instead of HttpUser")
+    parser.add_argument("--payload-pool", type=int,
+                       default=config.get('locust', {}).get('payload_pool', 16),
+                       help="Pre-encoded images per size, reused across requests")
+
+
+@events.init.add_listener
+def _(environment, **kwargs):
+    """Encode the request payloads once, before any user starts."""
+    options = environment.parsed_options
+    count = getattr(options, 'payload_pool', None) or 16
+    sizes = config.get('image_sizes', {})
+    for size, default in (('small', [640, 480]), ('large', [1920, 1080])):
+        width, height = sizes.get(size, default)
+        PAYLOADS[size] = build_payload_pool(width, height, count, f"test_{size}_image.jpg")
 
 
 @events.test_start.add_listener
@@ -182,6 +264,8 @@ def _(environment, **kwargs):
     """Event handler for test start."""
     env_name = environment.parsed_options.env if hasattr(environment, 'parsed_options') else 'unknown'
     env_config = config['environments'].get(env_name, {})
+    options = getattr(environment, 'parsed_options', None)
+    profile_name = getattr(options, 'profile', None)
     
     print("=" * 70)
     print("YOLO Backend API - Stress Test")
@@ -192,6 +276,13 @@ def _(environment, **kwargs):
         print(f"Target URL: {env_config.get('url', environment.host)}")
     else:
         print(f"Target URL: {environment.host}")
+    if profile_name:
+        profile = config['test_profiles'][profile_name]
+        print(f"Profile: {profile_name} ({profile.get('shape', 'ramp')}) - {profile.get('description', '')}")
+        for end, users, spawn_rate in profile_stages(profile):
+            print(f"  until {end:6.0f}s: {users} users (spawn rate {spawn_rate}/s)")
+    print(f"Client: {'FastHttpUser' if getattr(options, 'fast_http', False) else 'HttpUser'}, "
+          f"{sum(len(p) for p in PAYLOADS.values())} pre-encoded payloads")
     print(f"Users: {environment.runner.target_user_count if hasattr(environment.runner, 'target_user_count') else 'N/A'}")
     print("=" * 70)
 